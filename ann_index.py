@@ -0,0 +1,188 @@
+import os
+import math
+import argparse
+import logging
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Index type used when building or converting an index: flat, ivf_flat, ivf_pq or hnsw
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Build parameters
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))  # inverted lists; 0 picks about 4 * sqrt(vectors)
+PQ_M = int(os.getenv("FAISS_PQ_M", "16"))  # sub-quantizers per vector (rounded down to a divisor of the dimension)
+PQ_NBITS = 8
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))  # vectors sampled to train IVF/PQ
+ADD_BATCH_SIZE = 10000
+
+# Search parameters, applied whenever an index is loaded
+NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+# faiss wants at least this many training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def is_flat(index: faiss.Index) -> bool:
+    """Exact indexes can be edited in place; ANN indexes are rebuilt instead"""
+    return isinstance(index, faiss.IndexFlat)
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if is_flat(index):
+        return "flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return type(index).__name__
+
+
+def default_nlist(count: int) -> int:
+    return max(1, min(int(4 * math.sqrt(count)), count // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_m(dimension: int, m: int) -> int:
+    # PQ splits the vector into m equal sub-vectors
+    return max(candidate for candidate in range(1, min(m, dimension) + 1) if dimension % candidate == 0)
+
+
+def create_index(index_type: str, dimension: int, metric: int, count: int, nlist: int = IVF_NLIST) -> faiss.Index:
+    """Create an empty (untrained) index of the given type"""
+    if index_type == "flat":
+        return faiss.IndexFlat(dimension, metric)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, metric)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    nlist = nlist or default_nlist(count)
+    quantizer = faiss.IndexFlat(dimension, metric)
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+    if index_type == "ivf_pq":
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_m(dimension, PQ_M), PQ_NBITS, metric)
+    raise ValueError(f"Unknown FAISS index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+
+
+def configure_index(index: faiss.Index, nprobe: int = NPROBE, ef_search: int = EF_SEARCH) -> faiss.Index:
+    """Apply search parameters and make sure stored vectors can be reconstructed"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            # Needed to read vectors back out (rebuilds, the unified retriever)
+            ivf.make_direct_map()
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
+
+
+def search_params(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Parameters restricting a search to `selector`, with the index's own nprobe/efSearch"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def build_index(vectors: np.ndarray, metric: int, index_type: str = INDEX_TYPE, nlist: int = IVF_NLIST) -> faiss.Index:
+    """Train an index of the given type on the vectors and add them, keeping their order"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+    index = create_index(index_type, dimension, metric, count, nlist)
+    if not index.is_trained:
+        sample = vectors
+        if count > TRAIN_SAMPLE:
+            sample = vectors[np.random.default_rng(0).choice(count, TRAIN_SAMPLE, replace=False)]
+        logger.info(f"Training {index_type} index on {len(sample)} vectors")
+        index.train(sample)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).make_direct_map()
+    for start in range(0, count, ADD_BATCH_SIZE):
+        index.add(vectors[start:start + ADD_BATCH_SIZE])
+    return configure_index(index)
+
+
+def empty_like(index: faiss.Index) -> faiss.Index:
+    """An empty index with the same type, parameters and training as `index`"""
+    clone = faiss.clone_index(index)
+    clone.reset()
+    return configure_index(clone)
+
+
+def rebuild_with(index: faiss.Index, vectors: np.ndarray) -> faiss.Index:
+    """Re-add vectors to an empty copy of a trained index (used to drop deleted vectors).
+
+    IVF-PQ stores quantised vectors, so its reconstructions are approximate;
+    re-encoding them with the same codebooks gives back the same codes.
+    """
+    rebuilt = empty_like(index)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    for start in range(0, len(vectors), ADD_BATCH_SIZE):
+        rebuilt.add(vectors[start:start + ADD_BATCH_SIZE])
+    return rebuilt
+
+
+def read_vectors(index: faiss.Index) -> np.ndarray:
+    """All vectors of an index, in position order"""
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    configure_index(index)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def convert_vectorstore(store: FAISS, index_type: str = INDEX_TYPE, nlist: int = IVF_NLIST) -> FAISS:
+    """Replace a vector store's index with one of another type.
+
+    Vectors keep their positions, so the docstore mapping stays valid.
+    """
+    vectors = read_vectors(store.index)
+    store.index = build_index(vectors, store.index.metric_type, index_type, nlist)
+    return store
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    return faiss.serialize_index(index).nbytes
+
+
+def convert_directory(path: str, index_type: str = INDEX_TYPE, nlist: int = IVF_NLIST):
+    """Rebuild the index stored in a FAISS directory as another index type"""
+    # Imported here because index_store itself uses this module
+    from index_store import DurableFaissIndex, load_vectorstore
+
+    durable = DurableFaissIndex.read_generation(path) > 0 or any(
+        name.startswith("wal-") and os.path.getsize(os.path.join(path, name)) > 0 for name in os.listdir(path)
+    )
+    if durable:
+        # Verified answers: write the converted index as a new snapshot generation
+        index = DurableFaissIndex.load(path, None)
+        index.rebuild(index_type, nlist)
+        return
+    store = load_vectorstore(path, None)
+    before = index_type_of(store.index)
+    convert_vectorstore(store, index_type, nlist)
+    index_path = os.path.join(path, "index.faiss")
+    faiss.write_index(store.index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    logger.info(f"Converted '{path}' from {before} to {index_type} ({store.index.ntotal} vectors)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild a FAISS knowledge base index as another index type")
+    parser.add_argument("path", help="Index directory, e.g. faiss_index or faiss_index_improved")
+    parser.add_argument("--type", default=INDEX_TYPE, choices=INDEX_TYPES, help="Index type to build")
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST, help="IVF lists (0 picks a size from the corpus)")
+    args = parser.parse_args()
+    convert_directory(args.path, args.type, args.nlist)
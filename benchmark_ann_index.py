@@ -0,0 +1,86 @@
+import argparse
+import os
+import time
+from typing import Tuple
+import faiss
+import numpy as np
+from ann_index import build_index, configure_index, index_memory_bytes, read_vectors, INDEX_TYPES
+from index_store import DurableFaissIndex, load_vectorstore
+
+NPROBE_SWEEP = (1, 4, 16, 64)
+EF_SEARCH_SWEEP = (16, 32, 64, 128)
+
+
+def load_vectors(path: str) -> Tuple[np.ndarray, int]:
+    """Read every vector of a knowledge base directory (latest snapshot for the improved index)"""
+    generation = DurableFaissIndex.read_generation(path)
+    snapshot_path = path if generation == 0 else os.path.join(path, "snapshots", f"gen-{generation:06d}")
+    store = load_vectorstore(snapshot_path, None)
+    return read_vectors(store.index), store.index.metric_type
+
+
+def time_search(index: faiss.Index, queries: np.ndarray, k: int):
+    """Search one query at a time, as the bot does; returns (results, per-query latencies in ms)"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies)
+
+
+def recall(results: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(found) & set(expected)) / k for found, expected in zip(results, truth)]))
+
+
+def benchmark(path: str, index_types, k: int = 10, num_queries: int = 200):
+    """Measure recall@k and latency of ANN index types against the exact flat index"""
+    vectors, metric = load_vectors(path)
+    if len(vectors) <= num_queries:
+        print(f"Only {len(vectors)} vectors in '{path}'; need more than {num_queries} to benchmark")
+        return
+
+    # Hold out real questions as queries so none of them trivially finds itself
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    queries, corpus = vectors[order[:num_queries]], vectors[order[num_queries:]]
+    k = min(k, len(corpus))
+
+    flat = build_index(corpus, metric, "flat")
+    truth, flat_latencies = time_search(flat, queries, k)
+
+    print(f"\n=== ANN Index Benchmark: {path} ===")
+    print(f"Vectors: {len(corpus)} x {corpus.shape[1]}, queries: {num_queries}, recall@{k} against the flat index")
+    print(f"{'index':<10} {'param':<14} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8} {'memory MB':>10} {'build s':>8}")
+    print(f"{'flat':<10} {'-':<14} {1.0:>7.3f} {np.percentile(flat_latencies, 50):>8.3f} "
+          f"{np.percentile(flat_latencies, 99):>8.3f} {index_memory_bytes(flat) / 1e6:>10.1f} {'-':>8}")
+
+    for index_type in index_types:
+        if index_type == "flat":
+            continue
+        start = time.perf_counter()
+        index = build_index(corpus, metric, index_type)
+        build_seconds = time.perf_counter() - start
+        memory = index_memory_bytes(index) / 1e6
+        if index_type == "hnsw":
+            sweep = [("efSearch", value, dict(ef_search=value)) for value in EF_SEARCH_SWEEP]
+        else:
+            sweep = [("nprobe", value, dict(nprobe=value)) for value in NPROBE_SWEEP]
+        for name, value, params in sweep:
+            configure_index(index, **params)
+            results, latencies = time_search(index, queries, k)
+            print(f"{index_type:<10} {f'{name}={value}':<14} {recall(results, truth):>7.3f} "
+                  f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f} "
+                  f"{memory:>10.1f} {build_seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report recall versus latency of ANN index types for a knowledge base")
+    parser.add_argument("path", nargs="?", default="faiss_index", help="Index directory (default: faiss_index)")
+    parser.add_argument("--types", nargs="+", default=[t for t in INDEX_TYPES if t != "flat"], choices=INDEX_TYPES)
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--queries", type=int, default=200, help="Vectors held out as queries")
+    args = parser.parse_args()
+    benchmark(args.path, args.types, args.k, args.queries)
@@ -1,6 +1,16 @@
 from cachetools import TTLCache, LRUCache
 from functools import lru_cache
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from monitoring import metrics
+import numpy as np
+import unicodedata
+import threading
+import asyncio
+import hashlib
 import logging
+import sqlite3
+import os
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -10,13 +20,40 @@ logger = logging.getLogger(__name__)
 LLM_CACHE_SIZE = 1000
 LLM_CACHE_TTL = 3600  # 1 hour
 EMBEDDING_CACHE_SIZE = 10000
+EMBEDDING_DISK_CACHE_PATH = os.getenv("EMBEDDING_DISK_CACHE_PATH", "embedding_cache.db")
 PROCESSED_MESSAGES_CACHE_SIZE = 10000
 PROCESSED_MESSAGES_TTL = 86400  # 24 hours
+FLAG_VERDICT_CACHE_SIZE = 50000
 
 # Initialize caches
 llm_cache = TTLCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
 embedding_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+# Embeddings are looked up from worker threads too, and cachetools caches are not thread-safe
+embedding_cache_lock = threading.Lock()
 processed_messages = TTLCache(maxsize=PROCESSED_MESSAGES_CACHE_SIZE, ttl=PROCESSED_MESSAGES_TTL)
+flag_verdict_cache = LRUCache(maxsize=FLAG_VERDICT_CACHE_SIZE)
+
+def document_key(doc) -> str:
+    """Stable identifier for a retrieved document (docstore id, else content hash)."""
+    doc_id = getattr(doc, "id", None)
+    if doc_id:
+        return str(doc_id)
+    return hashlib.sha1(doc.page_content.encode()).hexdigest()
+
+def llm_cache_key(question: str, improved_docs, regular_docs, history_context: str = "") -> str:
+    """Key an LLM response by everything that went into the prompt.
+
+    Combines the normalised question, the ids of the retrieved documents (in
+    rank order, per tier) and a hash of the thread history, so a different
+    context can never be served a stale answer.
+    """
+    parts = [
+        normalize_text(question),
+        ",".join(document_key(doc) for doc in improved_docs),
+        ",".join(document_key(doc) for doc in regular_docs),
+        hashlib.sha256(history_context.encode()).hexdigest() if history_context else ""
+    ]
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
 
 def get_cached_llm_response(text: str) -> str:
     """Get cached LLM response if available."""
@@ -26,13 +63,28 @@ def set_cached_llm_response(text: str, response: str):
     """Cache LLM response."""
     llm_cache[text] = response
 
+def normalize_text(text: str) -> str:
+    """Normalise text for use in cache keys (unicode form, case and whitespace)."""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+def embedding_cache_key(text: str, model: str) -> str:
+    """Cache key for an embedding: hash of the model name and normalised text."""
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode()).hexdigest()
+
+def invalidate_llm_cache():
+    """Drop all cached LLM responses (e.g. after the knowledge base changes)."""
+    llm_cache.clear()
+    logger.info("LLM response cache invalidated")
+
 def get_cached_embedding(text: str):
     """Get cached embedding if available."""
-    return embedding_cache.get(text)
+    with embedding_cache_lock:
+        return embedding_cache.get(text)
 
 def set_cached_embedding(text: str, embedding):
     """Cache embedding."""
-    embedding_cache[text] = embedding
+    with embedding_cache_lock:
+        embedding_cache[text] = embedding
 
 def is_message_processed(message_id: str) -> bool:
     """Check if message has been processed."""
@@ -51,6 +103,195 @@ def get_cached_similar_questions(question: str, k: int = 5):
 def clear_caches():
     """Clear all caches."""
     llm_cache.clear()
-    embedding_cache.clear()
+    with embedding_cache_lock:
+        embedding_cache.clear()
     processed_messages.clear()
-    logger.info("All caches cleared") 
\ No newline at end of file
+    flag_verdict_cache.clear()
+    logger.info("All caches cleared")
+
+
+class EmbeddingDiskCache:
+    """SQLite-backed embedding store that survives restarts.
+
+    Vectors are stored as raw float32 blobs keyed by `embedding_cache_key`.
+    """
+
+    def __init__(self, path: str = EMBEDDING_DISK_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the stored vectors for whichever of `keys` are present."""
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]):
+        """Store vectors, replacing any existing entries."""
+        if not items:
+            return
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """Two-tier cache (in-memory LRU, then disk) in front of an embeddings model.
+
+    Query and document embeddings are cached separately, since providers such as
+    Google embed them with different task types. With a `query_batcher`
+    (an EmbeddingBatcher), async query misses are coalesced into batch calls.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        disk_cache: Optional[EmbeddingDiskCache] = None,
+        query_batcher=None
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.disk_cache = disk_cache
+        self.query_batcher = query_batcher
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Resolve keys from the memory tier, then the disk tier, promoting disk hits."""
+        found = {}
+        for key in keys:
+            vector = get_cached_embedding(key)
+            if vector is not None:
+                found[key] = vector
+        self.memory_hits += len(found)
+        for _ in found:
+            metrics.record_cache_hit("embedding_memory")
+
+        remaining = [key for key in keys if key not in found]
+        if remaining and self.disk_cache is not None:
+            try:
+                from_disk = self.disk_cache.get_many(remaining)
+            except Exception as e:
+                logger.error(f"Error reading embedding disk cache: {e}")
+                from_disk = {}
+            for key, vector in from_disk.items():
+                set_cached_embedding(key, vector)
+                metrics.record_cache_hit("embedding_disk")
+            self.disk_hits += len(from_disk)
+            found.update(from_disk)
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        for key, vector in items.items():
+            set_cached_embedding(key, vector)
+        if self.disk_cache is not None:
+            try:
+                self.disk_cache.set_many(items)
+            except Exception as e:
+                logger.error(f"Error writing embedding disk cache: {e}")
+
+    def _missing(self, keys: List[str], texts: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+        """Each text not found in the cache once, even if it appears several times in the batch"""
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            self.misses += len(missing)
+            for _ in missing:
+                metrics.record_cache_miss("embedding")
+            metrics.record_embedding_request()
+        return missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_cache_key(text, f"{self.model}:document") for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        missing = self._missing(keys, texts, found)
+        if missing:
+            computed = dict(zip(missing.keys(), self.embeddings.embed_documents(list(missing.values()))))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_cache_key(text, f"{self.model}:query")
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+        self.misses += 1
+        metrics.record_cache_miss("embedding")
+        metrics.record_embedding_request()
+        vector = self.embeddings.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """embed_documents without blocking the event loop: the disk tier is read in a thread
+        and the model is called through its async API"""
+        keys = [embedding_cache_key(text, f"{self.model}:document") for text in texts]
+        found = await asyncio.to_thread(self._lookup, list(dict.fromkeys(keys)))
+        missing = self._missing(keys, texts, found)
+        if missing:
+            computed = dict(zip(missing.keys(), await self.embeddings.aembed_documents(list(missing.values()))))
+            await asyncio.to_thread(self._store, computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = embedding_cache_key(text, f"{self.model}:query")
+        vector = get_cached_embedding(key)
+        if vector is not None:
+            # Memory hits are answered without leaving the loop
+            self.memory_hits += 1
+            metrics.record_cache_hit("embedding_memory")
+            return vector
+        found = await asyncio.to_thread(self._lookup, [key])
+        if key in found:
+            return found[key]
+        self.misses += 1
+        metrics.record_cache_miss("embedding")
+        if self.query_batcher is not None:
+            # The batcher records the requests it actually sends
+            vector = await self.query_batcher.embed(text)
+        else:
+            metrics.record_embedding_request()
+            vector = await self.embeddings.aembed_query(text)
+        await asyncio.to_thread(self._store, {key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        """Hit and miss counts and rates for both cache tiers."""
+        total = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+            "memory_size": len(embedding_cache)
+        }
@@ -0,0 +1,115 @@
+import os
+import threading
+import logging
+from collections import deque
+from typing import Dict, List
+from cachetools import LRUCache
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Exchanges of a thread that are fed back to the LLM
+HISTORY_TURNS = 5
+# Threads whose recent turns are kept in memory (0 disables the cache, e.g. with several workers)
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "1000"))
+APPEND_RETRIES = 3
+
+
+class ConversationStore:
+    """Turn-per-row conversation history with a hot-thread cache.
+
+    Every exchange is one ConversationTurn row, so appending is a single
+    insert and reading the last N turns is a bounded query on the
+    (thread_id, turn_no) index. Active threads keep their last turns and
+    next turn number in an LRU, so a busy thread only needs an index-only
+    max(turn_no) check before its turns are reused. The cache is per
+    process: that check catches turns another worker appended before a
+    read, and the unique index catches them on append; either way the entry
+    is reloaded.
+    """
+
+    def __init__(self, turns: int = HISTORY_TURNS, maxsize: int = CONVERSATION_CACHE_SIZE):
+        self.turns = turns
+        self._cache = LRUCache(maxsize=maxsize) if maxsize > 0 else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def _load(self, db: AsyncSession, thread_id: str) -> Dict:
+        result = await db.execute(
+            select(models.ConversationTurn.turn_no, models.ConversationTurn.human, models.ConversationTurn.ai)
+            .where(models.ConversationTurn.thread_id == thread_id)
+            .order_by(models.ConversationTurn.turn_no.desc())
+            .limit(self.turns)
+        )
+        rows = result.all()
+        return {
+            "turns": deque(({"Human": row.human, "AI": row.ai} for row in reversed(rows)), maxlen=self.turns),
+            "next_turn": rows[0].turn_no + 1 if rows else 1
+        }
+
+    async def _latest_turn(self, db: AsyncSession, thread_id: str) -> int:
+        latest = await db.scalar(
+            select(func.max(models.ConversationTurn.turn_no)).where(models.ConversationTurn.thread_id == thread_id)
+        )
+        return latest or 0
+
+    async def _entry(self, db: AsyncSession, thread_id: str, validate: bool = False) -> Dict:
+        if self._cache is not None:
+            with self._lock:
+                entry = self._cache.get(thread_id)
+            # Reuse the cached turns only if no other worker has appended since
+            if entry is not None and (not validate or await self._latest_turn(db, thread_id) == entry["next_turn"] - 1):
+                self.hits += 1
+                return entry
+        self.misses += 1
+        entry = await self._load(db, thread_id)
+        if self._cache is not None:
+            with self._lock:
+                self._cache[thread_id] = entry
+        return entry
+
+    async def get_recent(self, db: AsyncSession, thread_id: str) -> List[Dict[str, str]]:
+        """The last `turns` exchanges of a thread, oldest first"""
+        return list((await self._entry(db, thread_id, validate=True))["turns"])
+
+    async def append(self, db: AsyncSession, thread_id: str, human_msg: str, ai_response: str):
+        """Store one exchange at the end of the thread"""
+        entry = await self._entry(db, thread_id)
+        for attempt in range(APPEND_RETRIES):
+            db.add(models.ConversationTurn(
+                thread_id=thread_id,
+                turn_no=entry["next_turn"],
+                human=human_msg,
+                ai=ai_response
+            ))
+            try:
+                await db.commit()
+                break
+            except IntegrityError:
+                # Another worker appended to this thread; reload its tail and retry
+                await db.rollback()
+                entry = await self._load(db, thread_id)
+                if self._cache is not None:
+                    with self._lock:
+                        self._cache[thread_id] = entry
+        else:
+            raise RuntimeError(f"Could not append to conversation {thread_id} after {APPEND_RETRIES} attempts")
+        with self._lock:
+            entry["turns"].append({"Human": human_msg, "AI": ai_response})
+            entry["next_turn"] += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "cached_threads": len(self._cache) if self._cache is not None else 0
+        }
+
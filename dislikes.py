@@ -0,0 +1,111 @@
+import os
+import asyncio
+import logging
+from typing import Optional, Sequence, Tuple
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from flagged_index import FlaggedQuestionIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cosine similarity above which a disliked question counts as one that is already flagged
+DISLIKE_MERGE_THRESHOLD = float(os.getenv("DISLIKE_MERGE_THRESHOLD", "0.92"))
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class DislikeRecorder:
+    """Records thumbs-down reactions as flagged questions without creating duplicates.
+
+    A dislike is merged into an existing flagged question when it is for the
+    same Slack message, or for a question whose embedding is within
+    `threshold` cosine similarity of one already flagged (looked up in the
+    resident flagged index). Only otherwise is a new row inserted. Counts
+    are incremented in SQL (dislike_count = dislike_count + 1), so
+    concurrent reactions never lose an update.
+    """
+
+    def __init__(self, flagged_index: FlaggedQuestionIndex, threshold: float = DISLIKE_MERGE_THRESHOLD):
+        self.flagged_index = flagged_index
+        self.threshold = threshold
+        self.inserted = 0
+        self.merged = 0
+
+    async def increment(self, db: AsyncSession, *criteria) -> Optional[Tuple[int, int]]:
+        """Add one dislike to the flagged question matching `criteria`; (id, new count) or None if there is none"""
+        result = await db.execute(
+            update(models.FlaggedQuestion)
+            .where(*criteria)
+            .values(dislike_count=models.FlaggedQuestion.dislike_count + 1)
+            .returning(models.FlaggedQuestion.id, models.FlaggedQuestion.dislike_count)
+        )
+        row = result.first()
+        await db.commit()
+        return (row.id, row.dislike_count) if row is not None else None
+
+    async def record_repeat(self, db: AsyncSession, channel: str, reply_ts: str) -> Optional[Tuple[int, int]]:
+        """Add a dislike to the flagged question for this message if it is already flagged; (id, new count) or None"""
+        existing = await self.increment(
+            db, models.FlaggedQuestion.channel == channel, models.FlaggedQuestion.reply_ts == reply_ts
+        )
+        if existing is not None:
+            self.merged += 1
+        return existing
+
+    async def record(
+        self,
+        db: AsyncSession,
+        channel: str,
+        reply_ts: str,
+        question: str,
+        answer: str,
+        question_embedding: Optional[Sequence[float]]
+    ) -> Tuple[int, int, bool]:
+        """Record a dislike of the answer in (channel, reply_ts); returns (question id, dislike count, merged)"""
+        same_message = await self.record_repeat(db, channel, reply_ts)
+        if same_message is not None:
+            return same_message + (True,)
+
+        if question_embedding is not None:
+            matches = await asyncio.to_thread(self.flagged_index.search, question_embedding, threshold=self.threshold, k=1)
+            if matches:
+                near_duplicate = await self.increment(db, models.FlaggedQuestion.id == matches[0][0])
+                if near_duplicate is not None:
+                    self.merged += 1
+                    logger.info(f"Merged dislike into flagged question {near_duplicate[0]} (similarity {matches[0][1]:.3f})")
+                    return near_duplicate + (True,)
+
+        # A reaction to the same message arriving at the same time turns this insert into an increment
+        insert = UPSERT_INSERTS[db.get_bind().dialect.name](models.FlaggedQuestion)
+        result = await db.execute(
+            insert.values(
+                question=question,
+                llm_response=answer,
+                question_embedding=models.embedding_to_blob(question_embedding) if question_embedding is not None else None,
+                dislike_count=1,
+                channel=channel,
+                reply_ts=reply_ts
+            )
+            .on_conflict_do_update(
+                index_elements=["channel", "reply_ts"],
+                set_={"dislike_count": models.FlaggedQuestion.dislike_count + 1}
+            )
+            .returning(models.FlaggedQuestion.id, models.FlaggedQuestion.dislike_count)
+        )
+        question_id, dislike_count = result.one()
+        await db.commit()
+        if dislike_count > 1:
+            self.merged += 1
+            return question_id, dislike_count, True
+        self.inserted += 1
+        if question_embedding is not None:
+            self.flagged_index.add(question_id, question_embedding)
+        return question_id, dislike_count, False
+
+    def stats(self) -> dict:
+        return {"inserted": self.inserted, "merged": self.merged}
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from monitoring import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Embedding micro-batching configuration
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))  # how long a request waits for others to join
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))  # a full batch is sent without waiting
+
+EmbedBatch = Callable[[List[str]], Awaitable[List[List[float]]]]
+EmbedOne = Callable[[str], Awaitable[List[float]]]
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding requests into batch calls.
+
+    The first request starts a `window_ms` timer; requests arriving before
+    it fires join the same batch, which is sent as one `embed_batch` call
+    (or as soon as it reaches `max_batch` texts). Identical texts in a batch
+    are embedded once. Each caller gets its own vector back. If the batch
+    call fails, or returns no vector for some texts, those texts are retried
+    one by one with `embed_one`, so a bad item only fails its own caller.
+    A window of 0 or a max batch of 1 disables batching.
+    """
+
+    def __init__(
+        self,
+        embed_batch: EmbedBatch,
+        embed_one: EmbedOne,
+        window_ms: float = EMBED_BATCH_WINDOW_MS,
+        max_batch: int = EMBED_BATCH_MAX_SIZE
+    ):
+        self.embed_batch = embed_batch
+        self.embed_one = embed_one
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._dispatches: Set[asyncio.Task] = set()
+        self.requests = 0
+        self.batches = 0
+        self.fallbacks = 0
+
+    async def embed(self, text: str) -> List[float]:
+        self.requests += 1
+        if self.window <= 0 or self.max_batch <= 1:
+            metrics.record_embedding_request()
+            return await self.embed_one(text)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._dispatch(batch))
+            # Keep a reference so the task isn't garbage collected mid-flight
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            texts = list(dict.fromkeys(text for text, future in batch if not future.cancelled()))
+            results = await self._embed_all(texts) if texts else {}
+            for text, future in batch:
+                if future.done():
+                    continue
+                result = results[text]
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            # Never leave a caller waiting, e.g. if the dispatch is cancelled at shutdown
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Embedding batch was interrupted"))
+
+    async def _embed_all(self, texts: List[str]) -> Dict[str, object]:
+        """Vector (or the exception raised for it) for each text"""
+        self.batches += 1
+        start = time.monotonic()
+        results = {}
+        try:
+            metrics.record_embedding_request()
+            vectors = await self.embed_batch(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"embedding batch returned {len(vectors)} vectors for {len(texts)} texts")
+            results = {text: vector for text, vector in zip(texts, vectors) if vector is not None and len(vector)}
+        except Exception as e:
+            logger.warning(f"Embedding batch of {len(texts)} failed, embedding individually: {e}")
+        metrics.record_embedding_batch(len(texts), time.monotonic() - start)
+
+        failed = [text for text in texts if text not in results]
+        if failed:
+            self.fallbacks += len(failed)
+            metrics.record_embedding_batch_fallback(len(failed))
+            for _ in failed:
+                metrics.record_embedding_request()
+            outcomes = await asyncio.gather(*(self.embed_one(text) for text in failed), return_exceptions=True)
+            results.update(zip(failed, outcomes))
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "fallbacks": self.fallbacks,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0
+        }
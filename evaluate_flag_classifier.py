@@ -0,0 +1,98 @@
+import argparse
+import csv
+import os
+from dotenv import load_dotenv
+from langchain_openai import OpenAI
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import models
+from database import SessionLocal
+from cache import CachedEmbeddings, EmbeddingDiskCache
+from flag_classifier import FlagClassifier, classify_with_llm, FLAG_THRESHOLD, CLEAR_THRESHOLD
+from flagged_index import FlaggedQuestionIndex
+
+EMBEDDING_MODEL = "models/embedding-001"
+
+
+def load_questions(db, csv_path: str = None, limit: int = None):
+    """Collect (question, flagged_question_id) pairs to evaluate.
+
+    Uses the 'question' column of a CSV when given, otherwise every flagged
+    question plus the human turns of stored conversations.
+    """
+    questions = []
+    if csv_path:
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                if row.get("question", "").strip():
+                    questions.append((row["question"], None))
+    else:
+        for row in db.query(models.FlaggedQuestion).all():
+            questions.append((row.question, row.id))
+        for turn in db.query(models.ConversationTurn.human).all():
+            if turn.human.strip():
+                questions.append((turn.human, None))
+    return questions[:limit] if limit else questions
+
+
+def evaluate(csv_path: str = None, limit: int = None):
+    """Compare the local flagged-content classifier against the LLM classifier"""
+    load_dotenv()
+    llm = OpenAI()
+    embeddings = CachedEmbeddings(
+        GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=os.getenv("GOOGLE_API_KEY")),
+        model=EMBEDDING_MODEL,
+        disk_cache=EmbeddingDiskCache()
+    )
+
+    db = SessionLocal()
+    try:
+        index = FlaggedQuestionIndex()
+        rows = db.query(models.FlaggedQuestion.id, models.FlaggedQuestion.question_embedding).filter(
+            models.FlaggedQuestion.question_embedding.isnot(None)
+        ).all()
+        index.build((row.id, models.blob_to_embedding(row.question_embedding)) for row in rows)
+        questions = load_questions(db, csv_path, limit)
+    finally:
+        db.close()
+
+    if not questions:
+        print("No questions to evaluate")
+        return
+
+    classifier = FlagClassifier(index, lambda text: classify_with_llm(llm, text))
+    # Query embeddings, as in production (document embeddings use a different task type)
+    vectors = [embeddings.embed_query(question) for question, _ in questions]
+
+    confident = agree_confident = 0
+    agree_with_fallback = 0
+    confusion = {(True, True): 0, (True, False): 0, (False, True): 0, (False, False): 0}
+    for (question, question_id), vector in zip(questions, vectors):
+        # Leave the question's own row out so flagged questions don't trivially match themselves
+        local, similarity = classifier.local_verdict(vector, exclude_id=question_id)
+        llm_verdict = classify_with_llm(llm, question)
+        if local is not None:
+            confident += 1
+            agree_confident += local == llm_verdict
+            confusion[(local, llm_verdict)] += 1
+        # In production uncertain questions are answered by the LLM, so they always agree
+        agree_with_fallback += (local if local is not None else llm_verdict) == llm_verdict
+
+    total = len(questions)
+    print(f"\n=== Flag Classifier Evaluation ===")
+    print(f"Questions evaluated: {total}")
+    print(f"Thresholds: flag >= {FLAG_THRESHOLD}, clear < {CLEAR_THRESHOLD}")
+    print(f"Answered locally: {confident} ({confident / total:.1%}), LLM fallback: {total - confident} ({(total - confident) / total:.1%})")
+    if confident:
+        print(f"Agreement on local verdicts: {agree_confident / confident:.1%}")
+    print(f"End-to-end agreement with the LLM classifier: {agree_with_fallback / total:.1%}")
+    print("Confusion on local verdicts (local, llm):")
+    for (local, llm_verdict), count in confusion.items():
+        print(f"  local={int(local)} llm={int(llm_verdict)}: {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the local flagged-content classifier with the LLM classifier")
+    parser.add_argument("--csv", help="CSV file with a 'question' column (defaults to questions from the database)")
+    parser.add_argument("--limit", type=int, help="Evaluate at most this many questions")
+    args = parser.parse_args()
+    evaluate(args.csv, args.limit)
@@ -0,0 +1,99 @@
+import os
+import logging
+import threading
+from typing import Callable, Optional, Sequence, Tuple
+from langchain_core.prompts import ChatPromptTemplate
+from cache import flag_verdict_cache, normalize_text
+from flagged_index import FlaggedQuestionIndex
+from monitoring import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Similarity to the nearest flagged question at or above which a question is flagged locally.
+# Also where find_similar_flagged_questions refuses, so no LLM verdict is asked for and then ignored
+FLAG_THRESHOLD = float(os.getenv("FLAG_CLASSIFIER_FLAG_THRESHOLD", "0.8"))
+# Similarity below which a question is cleared locally; anything in between goes to the LLM
+CLEAR_THRESHOLD = float(os.getenv("FLAG_CLASSIFIER_CLEAR_THRESHOLD", "0.75"))
+
+FLAG_PROMPT = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        """You are a classifier that determines if a user's question is asking about flagged or disliked content.
+        Return ONLY the number 1 if the question is asking about flagged/disliked content, or 0 if it's not.
+        DO NOT return any other text or explanation."""
+    ),
+    ("human", "{question}")
+])
+
+
+def classify_with_llm(llm, text: str) -> bool:
+    """Ask the LLM whether the text is asking about flagged content"""
+    chain = FLAG_PROMPT | llm
+    response = chain.invoke({"question": text})
+    # Chat models return a message, completion models a plain string
+    content = getattr(response, "content", response)
+    return content.strip() == "1"
+
+
+class FlagClassifier:
+    """Nearest-neighbour flagged-content classifier with an LLM fallback.
+
+    The verdict comes from the similarity between the question and its nearest
+    neighbour in the flagged question index. Only questions that fall between
+    the clear and flag thresholds are sent to the LLM. Verdicts are cached per
+    normalised question and index version, so the same question gets the same
+    answer until a question is flagged or answered.
+    """
+
+    def __init__(
+        self,
+        index: FlaggedQuestionIndex,
+        llm_classify: Callable[[str], bool],
+        flag_threshold: float = FLAG_THRESHOLD,
+        clear_threshold: float = CLEAR_THRESHOLD
+    ):
+        self.index = index
+        self.llm_classify = llm_classify
+        self.flag_threshold = flag_threshold
+        self.clear_threshold = clear_threshold
+        # Classification runs in worker threads and cachetools caches are not thread-safe
+        self._cache_lock = threading.Lock()
+
+    def local_verdict(self, query_embedding: Sequence[float], exclude_id: Optional[int] = None) -> Tuple[Optional[bool], float]:
+        """Return (verdict, nearest similarity); verdict is None when the local model is uncertain"""
+        matches = self.index.search(query_embedding, threshold=-1.0, k=2)
+        similarity = next((score for question_id, score in matches if question_id != exclude_id), -1.0)
+        if similarity >= self.flag_threshold:
+            return True, similarity
+        if similarity < self.clear_threshold:
+            return False, similarity
+        return None, similarity
+
+    def classify(self, text: str, query_embedding: Sequence[float]) -> bool:
+        """Classify a question, consulting the LLM only when the local verdict is uncertain"""
+        # Taken before classifying, so a verdict racing with an index change is never reused
+        key = (self.index.version, normalize_text(text))
+        with self._cache_lock:
+            cached = flag_verdict_cache.get(key)
+        if cached is not None:
+            metrics.record_flag_classification("cache")
+            return cached
+
+        verdict, similarity = self.local_verdict(query_embedding)
+        if verdict is not None:
+            metrics.record_flag_classification("local")
+        else:
+            logger.debug(f"Flag classifier uncertain (similarity {similarity:.3f}), asking the LLM")
+            metrics.record_flag_classification("llm")
+            try:
+                verdict = self.llm_classify(text)
+            except Exception as e:
+                # Don't cache a verdict we never actually reached
+                logger.error(f"Error in LLM flag classification: {e}")
+                return False
+
+        with self._cache_lock:
+            flag_verdict_cache[key] = verdict
+        return verdict
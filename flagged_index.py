@@ -0,0 +1,136 @@
+import threading
+import logging
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 1024
+
+
+def _normalize(vector: Sequence[float]) -> Optional[np.ndarray]:
+    """Return the vector as unit-length float32, or None if it has no direction."""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    if not np.isfinite(norm) or norm == 0:
+        return None
+    return vector / norm
+
+
+class FlaggedQuestionIndex:
+    """Resident cosine-similarity index over flagged-question embeddings.
+
+    Vectors are kept pre-normalised in a single float32 matrix alongside an
+    array of question ids, so a lookup is one matrix-vector product. Rows are
+    added and removed in place (removal swaps the last row into the gap), so
+    the index never has to be reloaded from the database. `version` is
+    bumped on every change, so results derived from the index can be keyed
+    by it and go stale as soon as the flagged set changes.
+    """
+
+    def __init__(self, initial_capacity: int = INITIAL_CAPACITY):
+        self._initial_capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+        self._lock = threading.RLock()
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, question_id: int) -> bool:
+        return question_id in self._positions
+
+    def ids(self) -> Set[int]:
+        """Ids of the indexed questions."""
+        with self._lock:
+            return set(self._positions)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    def _ensure_capacity(self, dim: int, needed: int):
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, needed)
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            self._ids = np.zeros(capacity, dtype=np.int64)
+            return
+        if dim != self._matrix.shape[1]:
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {self._matrix.shape[1]}")
+        capacity = self._matrix.shape[0]
+        if needed > capacity:
+            # Grow geometrically so appends stay amortised O(1)
+            new_capacity = max(needed, capacity * 2)
+            matrix = np.zeros((new_capacity, dim), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            ids = np.zeros(new_capacity, dtype=np.int64)
+            ids[:self._size] = self._ids[:self._size]
+            self._matrix, self._ids = matrix, ids
+
+    def build(self, rows: Iterable[Tuple[int, Sequence[float]]]):
+        """Replace the index contents with (question_id, embedding) rows."""
+        with self._lock:
+            self._matrix = None
+            self._ids = np.empty(0, dtype=np.int64)
+            self._positions = {}
+            self._size = 0
+            self.version += 1
+            for question_id, vector in rows:
+                self.add(question_id, vector)
+            logger.info(f"Built flagged question index with {self._size} vectors")
+
+    def add(self, question_id: int, vector: Sequence[float]):
+        """Insert or replace the embedding for a question."""
+        normalized = _normalize(vector)
+        if normalized is None:
+            logger.warning(f"Skipping flagged question {question_id}: empty or zero embedding")
+            return
+        with self._lock:
+            position = self._positions.get(question_id)
+            if position is None:
+                self._ensure_capacity(normalized.shape[0], self._size + 1)
+                position = self._size
+                self._size += 1
+                self._positions[question_id] = position
+                self._ids[position] = question_id
+            elif normalized.shape[0] != self._matrix.shape[1]:
+                raise ValueError(f"Embedding dimension {normalized.shape[0]} does not match index dimension {self._matrix.shape[1]}")
+            self._matrix[position] = normalized
+            self.version += 1
+
+    def remove(self, question_id: int) -> bool:
+        """Remove a question from the index. Returns False if it was not indexed."""
+        with self._lock:
+            position = self._positions.pop(question_id, None)
+            if position is None:
+                return False
+            last = self._size - 1
+            if position != last:
+                self._matrix[position] = self._matrix[last]
+                moved_id = int(self._ids[last])
+                self._ids[position] = moved_id
+                self._positions[moved_id] = position
+            self._size = last
+            self.version += 1
+            return True
+
+    def search(self, vector: Sequence[float], threshold: float = 0.8, k: int = 5) -> List[Tuple[int, float]]:
+        """Return up to k (question_id, cosine similarity) pairs at or above threshold, best first."""
+        query = _normalize(vector)
+        with self._lock:
+            if query is None or self._size == 0 or k <= 0:
+                return []
+            if query.shape[0] != self._matrix.shape[1]:
+                raise ValueError(f"Query dimension {query.shape[0]} does not match index dimension {self._matrix.shape[1]}")
+            similarities = self._matrix[:self._size] @ query
+            candidates = np.flatnonzero(similarities >= threshold)
+            if candidates.size > k:
+                top = np.argpartition(-similarities[candidates], k - 1)[:k]
+                candidates = candidates[top]
+            order = candidates[np.argsort(-similarities[candidates])]
+            return [(int(self._ids[i]), float(similarities[i])) for i in order]
@@ -0,0 +1,699 @@
+import os
+import json
+import time
+import base64
+import pickle
+import shutil
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from uuid import uuid4
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from ann_index import configure_index, convert_vectorstore, read_vectors, rebuild_with, IVF_NLIST
+
+try:
+    import fcntl
+except ImportError:  # Windows: shared mode is unavailable, single-process mode still works
+    fcntl = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Snapshot configuration
+SNAPSHOT_EVERY_OPS = int(os.getenv("FAISS_SNAPSHOT_EVERY_OPS", "100"))  # snapshot after this many logged operations...
+SNAPSHOT_INTERVAL = float(os.getenv("FAISS_SNAPSHOT_INTERVAL", "300"))  # ...or this many seconds with pending operations
+SNAPSHOT_POLL_INTERVAL = 5.0
+
+# Multi-worker configuration
+SHARED_INDEX = os.getenv("FAISS_SHARED_INDEX", "false").lower() == "true"
+RELOAD_INTERVAL = float(os.getenv("FAISS_RELOAD_INTERVAL", "1.0"))  # how often workers look for changes from other workers
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "LOCK"
+SNAPSHOT_DIR = "snapshots"
+
+
+def _fsync_dir(path: str):
+    """Make a rename or file creation inside `path` durable"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _encode_vectors(vectors: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(vectors, dtype=np.float32).tobytes()).decode()
+
+
+def _decode_vectors(data: str, count: int) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).reshape(count, -1)
+
+
+def _mmap_flag_candidates() -> List[int]:
+    """faiss read flags to try, most memory-sharing first"""
+    candidates = []
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        # Flat codes (IndexFlat, HNSW storage) mapped straight from the file
+        candidates.append(faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    # Inverted lists of IVF indexes
+    candidates.append(faiss.IO_FLAG_MMAP)
+    return candidates
+
+
+def load_vectorstore(path: str, embeddings: Embeddings, mmap: bool = False) -> FAISS:
+    """Load a save_local-format FAISS directory, optionally memory-mapping the vectors.
+
+    A memory-mapped index is backed by the page cache, so every worker
+    process loading the same snapshot shares one copy of the vectors. It
+    must be treated as read-only. ANN indexes get their nprobe/efSearch
+    settings applied.
+    """
+    index_path = os.path.join(path, "index.faiss")
+    index = None
+    if mmap:
+        for flags in _mmap_flag_candidates():
+            try:
+                index = faiss.read_index(index_path, flags)
+                break
+            except RuntimeError:
+                continue
+    if index is None:
+        index = faiss.read_index(index_path)
+    configure_index(index)
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def _search_store(store: Optional[FAISS], embedding: np.ndarray, k: int) -> List[Tuple[str, Document, float]]:
+    """Search one vector store, returning (doc_id, document, raw score)"""
+    if store is None or k <= 0 or store.index.ntotal == 0:
+        return []
+    query = np.array([embedding], dtype=np.float32)
+    if store._normalize_L2:
+        faiss.normalize_L2(query)
+    scores, indices = store.index.search(query, min(k, store.index.ntotal))
+    results = []
+    for score, i in zip(scores[0], indices[0]):
+        if i == -1:
+            continue
+        doc_id = store.index_to_docstore_id.get(int(i))
+        doc = store.docstore.search(doc_id) if doc_id is not None else None
+        if isinstance(doc, Document):
+            results.append((doc_id, doc, float(score)))
+    return results
+
+
+def _copy_store(store: FAISS) -> FAISS:
+    """A private copy of an in-memory vector store that can be changed without affecting the original"""
+    return FAISS(
+        store.embedding_function,
+        faiss.clone_index(store.index),
+        InMemoryDocstore(dict(store.docstore._dict)),
+        dict(store.index_to_docstore_id),
+        normalize_L2=store._normalize_L2,
+        distance_strategy=store.distance_strategy
+    )
+
+
+class _IndexState:
+    """A loaded snapshot plus the changes applied on top of it.
+
+    The base is never modified (it may be memory-mapped, or an ANN index,
+    which can't drop vectors in place): additions go to a small in-memory
+    delta index and deletions of base documents are recorded as tombstones,
+    both folded in by compact(). Published states are immutable; a writer
+    applies its change to a copy(), which only copies the delta and the
+    tombstones, and swaps the reference, so reads need no lock.
+    """
+
+    def __init__(self, base: FAISS):
+        self.base = base
+        self.delta: Optional[FAISS] = None
+        self.deleted: Set[str] = set()
+        self.higher_is_better = base.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+    def copy(self) -> "_IndexState":
+        state = _IndexState(self.base)
+        state.delta = _copy_store(self.delta) if self.delta is not None else None
+        state.deleted = set(self.deleted)
+        return state
+
+    @staticmethod
+    def _has(store: Optional[FAISS], doc_id: str) -> bool:
+        return store is not None and isinstance(store.docstore.search(doc_id), Document)
+
+    def contains(self, doc_id: str) -> bool:
+        return self._has(self.delta, doc_id) or (doc_id not in self.deleted and self._has(self.base, doc_id))
+
+    @property
+    def ntotal(self) -> int:
+        delta = self.delta.index.ntotal if self.delta is not None else 0
+        return self.base.index.ntotal + delta - len(self.deleted)
+
+    def apply(self, entry: dict):
+        """Apply a log record in place; only call this on a copy() that is not yet published"""
+        # Replay is idempotent: ids already present (or already gone) are skipped
+        if entry["op"] == "add":
+            vectors = _decode_vectors(entry["vectors"], len(entry["ids"]))
+            rows = [
+                (doc_id, text, metadata, vector)
+                for doc_id, text, metadata, vector in zip(entry["ids"], entry["texts"], entry["metadatas"], vectors)
+                if not self.contains(doc_id)
+            ]
+            if not rows:
+                return
+            self._delta_store().add_embeddings(
+                text_embeddings=[(text, vector) for _, text, _, vector in rows],
+                metadatas=[metadata for _, _, metadata, _ in rows],
+                ids=[doc_id for doc_id, _, _, _ in rows]
+            )
+        elif entry["op"] == "delete":
+            for doc_id in entry["ids"]:
+                if self._has(self.delta, doc_id):
+                    self.delta.delete([doc_id])
+                elif doc_id not in self.deleted and self._has(self.base, doc_id):
+                    self.deleted.add(doc_id)
+        else:
+            raise ValueError(f"Unknown write-ahead log operation: {entry['op']}")
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        for store in (self.delta, None if doc_id in self.deleted else self.base):
+            doc = store.docstore.search(doc_id) if store is not None else None
+            if isinstance(doc, Document):
+                return doc if doc.id == doc_id else Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata)
+        return None
+
+    def iter_vectors(self, batch_size: int) -> Iterator[Tuple[List[str], np.ndarray]]:
+        for store, skip in ((self.base, self.deleted), (self.delta, set())):
+            if store is None:
+                continue
+            total = store.index.ntotal
+            for start in range(0, total, batch_size):
+                count = min(batch_size, total - start)
+                vectors = store.index.reconstruct_n(start, count)
+                ids = [store.index_to_docstore_id[i] for i in range(start, start + count)]
+                keep = [j for j, doc_id in enumerate(ids) if doc_id not in skip]
+                if keep:
+                    yield [ids[j] for j in keep], vectors[keep]
+
+    def compact(self) -> FAISS:
+        """The base with the delta and tombstones folded in, as a new store; the state itself is unchanged.
+
+        The base's index is cloned when there are only additions, which not
+        every memory-mapped index supports, so compact shared indexes from
+        an unmapped copy.
+        """
+        if self.delta is None and not self.deleted:
+            return self.base
+        if self.deleted:
+            # Rebuild from the live vectors, keeping the trained quantiser / graph parameters
+            doc_ids, batches = [], []
+            for batch_ids, vectors in self.iter_vectors(10000):
+                doc_ids.extend(batch_ids)
+                batches.append(vectors)
+            vectors = np.concatenate(batches) if batches else np.empty((0, self.base.index.d), dtype=np.float32)
+            return FAISS(
+                self.base.embedding_function,
+                rebuild_with(self.base.index, vectors),
+                InMemoryDocstore({doc_id: self.get(doc_id) for doc_id in doc_ids}),
+                dict(enumerate(doc_ids)),
+                normalize_L2=self.base._normalize_L2,
+                distance_strategy=self.base.distance_strategy
+            )
+        # Additions only: ANN indexes can append the delta's vectors directly
+        delta_ids = [self.delta.index_to_docstore_id[i] for i in range(self.delta.index.ntotal)]
+        documents = [self.delta.docstore.search(doc_id) for doc_id in delta_ids]
+        store = _copy_store(self.base)
+        store.add_embeddings(
+            text_embeddings=list(zip([doc.page_content for doc in documents], read_vectors(self.delta.index))),
+            metadatas=[doc.metadata for doc in documents],
+            ids=delta_ids
+        )
+        return store
+
+    def _delta_store(self) -> FAISS:
+        if self.delta is None:
+            index = faiss.IndexFlat(self.base.index.d, self.base.index.metric_type)
+            self.delta = FAISS(
+                self.base.embedding_function, index, InMemoryDocstore(), {},
+                normalize_L2=self.base._normalize_L2
+            )
+        return self.delta
+
+    def search(self, embedding, k: int) -> List[Tuple[Document, float]]:
+        query = np.asarray(embedding, dtype=np.float32)
+        # Over-fetch from the base so tombstoned hits don't leave us short
+        results = [
+            hit for hit in _search_store(self.base, query, k + len(self.deleted))
+            if hit[0] not in self.deleted
+        ]
+        results.extend(_search_store(self.delta, query, k))
+        results.sort(key=lambda hit: hit[2], reverse=self.higher_is_better)
+        return [
+            (doc if doc.id == doc_id else Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata), score)
+            for doc_id, doc, score in results[:k]
+        ]
+
+
+class DurableFaissIndex:
+    """A FAISS vector store made durable with a write-ahead log and snapshots.
+
+    Every add/delete is appended to a log file and fsynced before it is
+    applied in memory, so a request only pays for one small sequential
+    write. A background task periodically writes the whole index to a new
+    generation directory (temp dir + rename) and atomically repoints the
+    CURRENT file at it. On startup the latest snapshot is loaded and the
+    logs written since are replayed.
+
+    In shared mode several worker processes use the same directory. Log
+    appends and snapshots are serialised with a file lock, the snapshot is
+    memory-mapped so workers share one copy of the vectors, and each worker
+    tails the log and swaps to newer generations in the background.
+
+    The in-memory state is copy-on-write (see _IndexState): writes, reloads
+    and snapshots only swap a reference under the state lock, so searches
+    run concurrently without taking it and are never blocked by them.
+
+    Directory layout (inside `path`):
+        index.faiss, index.pkl        generation 0 (the original save_local layout)
+        snapshots/gen-NNNNNN/         later generations
+        CURRENT                       {"generation": N}
+        wal-NNNNNN.log                operations applied on top of generation N
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embeddings: Embeddings,
+        shared: bool = SHARED_INDEX,
+        snapshot_every: int = SNAPSHOT_EVERY_OPS,
+        snapshot_interval: float = SNAPSHOT_INTERVAL,
+        reload_interval: float = RELOAD_INTERVAL
+    ):
+        if shared and fcntl is None:
+            logger.warning("Shared FAISS index mode needs fcntl; falling back to single-process mode")
+            shared = False
+        self.path = path
+        self.embeddings = embeddings
+        self.shared = shared
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.reload_interval = reload_interval
+        self.generation = 0
+        self._state: Optional[_IndexState] = None
+        self._lock = threading.RLock()  # guards swapping the in-memory state and its log position
+        self._mutex = threading.Lock()  # serialises log access within this process
+        self._lock_fd = open(os.path.join(path, LOCK_FILE), "a+") if shared else None
+        self._wal_generation = 0
+        self._wal_offset = 0
+        self._log_entries = 0
+        self._last_snapshot = time.monotonic()
+        self._background: Optional[asyncio.Task] = None
+        self.snapshots_written = 0
+        self.reloads = 0
+        self._listeners: List[Callable[[str, List[str], Optional[np.ndarray]], None]] = []
+
+    @property
+    def vectorstore(self) -> FAISS:
+        """The loaded snapshot (excluding changes held in the delta index)"""
+        return self._state.base
+
+    # ---- Paths and locking -----------------------------------------------
+
+    def _snapshot_path(self, generation: int) -> str:
+        if generation == 0:
+            return self.path
+        return os.path.join(self.path, SNAPSHOT_DIR, f"gen-{generation:06d}")
+
+    def _wal_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"wal-{generation:06d}.log")
+
+    @staticmethod
+    def read_generation(path: str) -> int:
+        """Generation the CURRENT file points at (0 if there is none)"""
+        try:
+            with open(os.path.join(path, CURRENT_FILE)) as f:
+                return int(json.load(f)["generation"])
+        except FileNotFoundError:
+            return 0
+
+    @contextmanager
+    def _log_lock(self, exclusive: bool = True):
+        """Serialise log access across threads and, in shared mode, across processes"""
+        with self._mutex:
+            if self._lock_fd is None:
+                yield
+                return
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    # ---- Change notifications ----------------------------------------------
+
+    def add_listener(self, listener: Callable[[str, List[str], Optional[np.ndarray]], None]):
+        """Register a callback for index changes.
+
+        Called as listener(op, ids, vectors) with op "add" (ids and their
+        vectors), "delete" (ids, vectors None) or "reload" (the whole index
+        was swapped; re-read it with iter_vectors).
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, op: str, ids: List[str] = None, vectors: Optional[np.ndarray] = None):
+        for listener in self._listeners:
+            try:
+                listener(op, ids or [], vectors)
+            except Exception as e:
+                logger.error(f"Error in FAISS index listener: {e}", exc_info=True)
+
+    def _notify_entry(self, entry: dict):
+        if entry["op"] == "add":
+            self._notify("add", entry["ids"], _decode_vectors(entry["vectors"], len(entry["ids"])))
+        else:
+            self._notify(entry["op"], entry["ids"])
+
+    # ---- Loading, replay and catching up ----------------------------------
+
+    @classmethod
+    def load(cls, path: str, embeddings: Embeddings, **kwargs) -> "DurableFaissIndex":
+        """Load the latest snapshot and replay the write-ahead log on top of it"""
+        store = cls(path, embeddings, **kwargs)
+        with store._log_lock():
+            store._swap_to(store.read_generation(path))
+            # Drop a torn final record left by a crash so new appends stay readable
+            wal_path = store._wal_path(store._wal_generation)
+            if os.path.exists(wal_path) and os.path.getsize(wal_path) > store._wal_offset:
+                logger.warning(f"Truncating incomplete record at offset {store._wal_offset} in {wal_path}")
+                with open(wal_path, "r+b") as f:
+                    f.truncate(store._wal_offset)
+        logger.info(f"Loaded FAISS index '{path}' generation {store.generation} ({store._state.ntotal} vectors, {store._log_entries} logged operations replayed, shared={store.shared})")
+        return store
+
+    def _replay_file(self, state: _IndexState, wal_path: str, offset: int, notify: bool = False) -> Tuple[int, int]:
+        """Apply complete records from offset onwards to an unpublished state; returns (records applied, new offset)"""
+        applied = 0
+        with open(wal_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                state.apply(entry)
+                if notify:
+                    self._notify_entry(entry)
+                applied += 1
+                offset += len(line)
+        return applied, offset
+
+    def _load_generation(self, generation: int, mmap: bool) -> Tuple[_IndexState, int, int, int]:
+        """Load a snapshot and replay wal-G, wal-G+1, ... (later logs exist if a snapshot was interrupted)"""
+        base = load_vectorstore(self._snapshot_path(generation), self.embeddings, mmap=mmap)
+        state = _IndexState(base)
+        wal_generation, offset, entries = generation, 0, 0
+        while os.path.exists(self._wal_path(wal_generation)):
+            applied, offset = self._replay_file(state, self._wal_path(wal_generation), 0)
+            entries += applied
+            if not os.path.exists(self._wal_path(wal_generation + 1)):
+                break
+            wal_generation += 1
+        return state, wal_generation, offset, entries
+
+    def _swap_to(self, generation: int):
+        # Built off to the side; only the reference swap happens under the state lock
+        state, wal_generation, offset, entries = self._load_generation(generation, mmap=self.shared)
+        with self._lock:
+            self._state = state
+            self.generation = generation
+            self._wal_generation = wal_generation
+            self._wal_offset = offset
+            self._log_entries = entries
+            self._notify("reload")
+
+    def _catch_up(self):
+        """Pick up a newer generation or log records written by other workers"""
+        disk_generation = self.read_generation(self.path)
+        if disk_generation > self.generation:
+            self._swap_to(disk_generation)
+            self._last_snapshot = time.monotonic()
+            self.reloads += 1
+            logger.info(f"Reloaded FAISS index '{self.path}' at generation {disk_generation}")
+            return
+        while True:
+            wal_path = self._wal_path(self._wal_generation)
+            if os.path.exists(wal_path) and os.path.getsize(wal_path) > self._wal_offset:
+                state = self._state.copy()
+                applied, offset = self._replay_file(state, wal_path, self._wal_offset, notify=True)
+                with self._lock:
+                    self._state = state
+                    self._wal_offset = offset
+                    self._log_entries += applied
+            if not os.path.exists(self._wal_path(self._wal_generation + 1)):
+                break
+            self._wal_generation += 1
+            self._wal_offset = 0
+
+    def _has_outside_changes(self) -> bool:
+        """Cheap unlocked check for whether another worker changed the index"""
+        if self.read_generation(self.path) != self.generation:
+            return True
+        try:
+            return os.path.getsize(self._wal_path(self._wal_generation)) > self._wal_offset
+        except FileNotFoundError:
+            return False
+
+    def refresh(self):
+        """Apply changes made by other worker processes"""
+        if self.shared and self._has_outside_changes():
+            with self._log_lock(exclusive=False):
+                self._catch_up()
+
+    # ---- Writes ----------------------------------------------------------
+
+    def _log_and_apply(self, entry: dict):
+        line = json.dumps(entry).encode() + b"\n"
+        with self._log_lock():
+            self._catch_up()
+            wal_path = self._wal_path(self._wal_generation)
+            with open(wal_path, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            state = self._state.copy()
+            state.apply(entry)
+            with self._lock:
+                self._state = state
+                self._wal_offset += len(line)
+                self._log_entries += 1
+            self._notify_entry(entry)
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """Embed, log and add documents"""
+        if not documents:
+            return []
+        ids = ids or [doc.id or str(uuid4()) for doc in documents]
+        texts = [doc.page_content for doc in documents]
+        # Embed before taking any lock; only the log write and in-memory add are serialised
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        self._log_and_apply({
+            "op": "add",
+            "ids": ids,
+            "texts": texts,
+            "metadatas": [doc.metadata for doc in documents],
+            "vectors": _encode_vectors(vectors)
+        })
+        return ids
+
+    def delete(self, ids: List[str]):
+        """Log and remove documents by id"""
+        if ids:
+            self._log_and_apply({"op": "delete", "ids": list(ids)})
+
+    # ---- Reads -----------------------------------------------------------
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        # Published states never change, so concurrent searches need no lock
+        return self._state.search(embedding, k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k)]
+
+    def get_document(self, doc_id: str) -> Optional[Document]:
+        """Look up a live document by id"""
+        return self._state.get(doc_id)
+
+    def iter_documents(self) -> Iterator[Tuple[str, Document]]:
+        """Yield (id, document) for every live document"""
+        state = self._state
+        doc_ids = [doc_id for doc_id in state.base.index_to_docstore_id.values() if doc_id not in state.deleted]
+        if state.delta is not None:
+            doc_ids.extend(state.delta.index_to_docstore_id.values())
+        for doc_id in doc_ids:
+            doc = state.get(doc_id)
+            if doc is not None:
+                yield doc_id, doc
+
+    def iter_vectors(self, batch_size: int = 10000) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """Yield (ids, vectors) batches of every live document, as of the first batch"""
+        # A consistent view without holding any lock while the consumer works
+        state = self._state
+        yield from state.iter_vectors(batch_size)
+
+    # ---- Snapshots -------------------------------------------------------
+
+    def needs_snapshot(self) -> bool:
+        if self._log_entries == 0:
+            return False
+        return (
+            self._log_entries >= self.snapshot_every
+            or time.monotonic() - self._last_snapshot >= self.snapshot_interval
+        )
+
+    def snapshot(self) -> int:
+        """Write the full index as a new generation and make it current"""
+        with self._log_lock():
+            self._catch_up()
+            if self._log_entries == 0:
+                # Nothing new (another worker may have just written a snapshot)
+                return self.generation
+
+            if self.shared:
+                # Fold the changes into an unmapped copy (see _IndexState.compact)
+                full, _, _, _ = self._load_generation(self.generation, mmap=False)
+            else:
+                full = self._state
+            # Compacted from an immutable state, so searches carry on meanwhile
+            return self._write_generation(full.compact())
+
+    def rebuild(self, index_type: str, nlist: int = IVF_NLIST) -> int:
+        """Retrain the index as another type (see ann_index) and write it as a new generation"""
+        with self._log_lock():
+            self._catch_up()
+            full, _, _, _ = self._load_generation(self.generation, mmap=False)
+            store = convert_vectorstore(full.compact(), index_type, nlist)
+            return self._write_generation(store, reload=True)
+
+    def _write_generation(self, store: FAISS, reload: bool = False) -> int:
+        """Persist a store as the next generation and switch to it. Called with the log lock held.
+
+        The store is never modified once built, so it is serialised without
+        the state lock. `reload` tells listeners the vectors may have changed
+        (a rebuilt index); compaction alone leaves them the same.
+        """
+        index_bytes = faiss.serialize_index(store.index).tobytes()
+        docstore_bytes = pickle.dumps((store.docstore, store.index_to_docstore_id))
+        new_generation = self._wal_generation + 1
+        snapshot_path = self._snapshot_path(new_generation)
+        tmp_path = snapshot_path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, data in (("index.faiss", index_bytes), ("index.pkl", docstore_bytes)):
+            with open(os.path.join(tmp_path, name), "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        shutil.rmtree(snapshot_path, ignore_errors=True)
+        os.replace(tmp_path, snapshot_path)
+        _fsync_dir(os.path.dirname(snapshot_path))
+
+        current_tmp = os.path.join(self.path, CURRENT_FILE + ".tmp")
+        with open(current_tmp, "w") as f:
+            json.dump({"generation": new_generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, os.path.join(self.path, CURRENT_FILE))
+        _fsync_dir(self.path)
+
+        previous_generation = self.generation
+        if self.shared:
+            self._swap_to(new_generation)
+        else:
+            with self._lock:
+                if store is not self._state.base:
+                    # Compacted or rebuilt: search the new index from now on
+                    self._state = _IndexState(store)
+                self.generation = new_generation
+                self._wal_generation = new_generation
+                self._wal_offset = 0
+                self._log_entries = 0
+            if reload:
+                self._notify("reload")
+        self._last_snapshot = time.monotonic()
+        self.snapshots_written += 1
+        self._cleanup(previous_generation, new_generation)
+        logger.info(f"Wrote snapshot generation {new_generation} of FAISS index '{self.path}'")
+        return new_generation
+
+    def _cleanup(self, previous_generation: int, current_generation: int):
+        """Remove logs and snapshots superseded by the current generation"""
+        for generation in range(previous_generation, current_generation):
+            try:
+                os.remove(self._wal_path(generation))
+            except FileNotFoundError:
+                pass
+            # Generation 0 is the original index directory itself and is left in place.
+            # Workers still mapping an old snapshot keep reading it until they swap.
+            if generation > 0:
+                shutil.rmtree(self._snapshot_path(generation), ignore_errors=True)
+
+    # ---- Background task -------------------------------------------------
+
+    async def _run_background(self):
+        poll_interval = self.reload_interval if self.shared else SNAPSHOT_POLL_INTERVAL
+        while True:
+            await asyncio.sleep(poll_interval)
+            try:
+                if self.shared:
+                    await asyncio.to_thread(self.refresh)
+                if self.needs_snapshot():
+                    await asyncio.to_thread(self.snapshot)
+            except Exception as e:
+                logger.error(f"Error maintaining FAISS index '{self.path}': {e}", exc_info=True)
+
+    def start(self):
+        """Start background snapshots (and hot reload in shared mode). Must be called from a running event loop."""
+        if self._background is None:
+            self._background = asyncio.create_task(self._run_background())
+
+    async def stop(self):
+        """Stop the background task and snapshot any remaining logged operations"""
+        if self._background is not None:
+            self._background.cancel()
+            try:
+                await self._background
+            except asyncio.CancelledError:
+                pass
+            self._background = None
+        if self._log_entries:
+            await asyncio.to_thread(self.snapshot)
+
+    def stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "vectors": self._state.ntotal,
+            "pending_log_operations": self._log_entries,
+            "snapshots_written": self.snapshots_written,
+            "shared": self.shared,
+            "reloads": self.reloads,
+            "delta_vectors": self._state.delta.index.ntotal if self._state.delta is not None else 0,
+            "tombstones": len(self._state.deleted)
+        }
@@ -0,0 +1,355 @@
+import os
+import csv
+import json
+import asyncio
+import logging
+from collections import deque
+from contextlib import closing
+from datetime import datetime
+from uuid import NAMESPACE_URL, uuid4, uuid5
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+from langchain_core.documents import Document
+from database import AsyncSessionLocal
+from job_queue import JobQueue
+from knowledge_dedup import KnowledgeDeduplicator, INSERTED, UPDATED, SKIPPED
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# CSV ingestion configuration
+INGEST_DIR = os.getenv("INGEST_DIR", "ingest_jobs")  # uploaded files and job checkpoints
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))  # question-answer pairs embedded per batch
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))  # batches embedded at the same time
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+REQUIRED_COLUMNS = {"question", "answer"}
+
+# Jobs in these states are picked up again on startup
+UNFINISHED = ("queued", "running")
+
+
+class IngestionError(Exception):
+    """Raised when an upload is rejected before a job is created"""
+
+
+def _read_records(path: str, offset: int) -> Iterator[Tuple[List[str], int]]:
+    """Yield (CSV record, byte offset just after it), starting at a byte offset.
+
+    Lines are read as bytes and counted before decoding, so the offset after
+    every record is exact and can be used as a resume point. The csv module
+    only pulls further lines for quoted fields that span several lines.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        position = offset
+
+        def lines():
+            nonlocal position
+            for raw in f:
+                # utf-8-sig drops a byte order mark at the start of the file
+                line = raw.decode("utf-8-sig" if position == 0 else "utf-8")
+                position += len(raw)
+                yield line
+
+        for record in csv.reader(lines()):
+            yield record, position
+
+
+def build_document(question: str, answer: str, source: str = "csv_upload") -> Document:
+    """Knowledge base document for a verified question-answer pair"""
+    return Document(
+        page_content=f"""Question: {question}
+Answer: {answer}""",
+        metadata={
+            "source": source,
+            "timestamp": datetime.utcnow().isoformat(),
+            "original_question": question
+        }
+    )
+
+
+class CsvIngestionManager:
+    """Background ingestion of question-answer CSV uploads into a knowledge base index.
+
+    An upload is streamed to disk and becomes a job. The job parses the file
+    record by record and embeds it in batches of `batch_size` pairs, with at
+    most `concurrency` batches in flight, adding each batch to the index as
+    soon as it is embedded. Pairs already in the knowledge base are skipped
+    before embedding and changed answers replace the old document (see
+    knowledge_dedup). After each batch the job state, including the
+    byte offset reached, is checkpointed to `<job_id>.json`. A failed or
+    interrupted job resumes from its last checkpoint. Document ids are
+    derived from the job id and row number, so rows added again after a
+    crash are skipped by the index rather than duplicated.
+    """
+
+    def __init__(
+        self,
+        index,
+        dedup: Optional[KnowledgeDeduplicator] = None,
+        on_batch: Optional[Callable[[], None]] = None,
+        directory: str = INGEST_DIR,
+        batch_size: int = INGEST_BATCH_SIZE,
+        concurrency: int = INGEST_CONCURRENCY
+    ):
+        self.index = index
+        self.dedup = dedup
+        self.on_batch = on_batch
+        self.directory = directory
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.queue = JobQueue("csv_ingestion", maxsize=100, workers=1)
+        os.makedirs(directory, exist_ok=True)
+        self.jobs: Dict[str, dict] = self._load_jobs()
+
+    # ---- Job state ---------------------------------------------------------
+
+    def _csv_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.csv")
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _load_jobs(self) -> Dict[str, dict]:
+        jobs = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        job = json.load(f)
+                    jobs[job["job_id"]] = job
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Skipping unreadable ingestion job file {name}: {e}")
+        return jobs
+
+    def _save(self, job: dict):
+        job["updated_at"] = datetime.utcnow().isoformat()
+        path = self._job_path(job["job_id"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(job, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {**job, "progress": job["bytes_done"] / job["total_bytes"] if job["total_bytes"] else 1.0}
+
+    def list_jobs(self) -> List[dict]:
+        return sorted((self.status(job_id) for job_id in self.jobs), key=lambda job: job["created_at"], reverse=True)
+
+    # ---- Lifecycle ---------------------------------------------------------
+
+    async def start(self):
+        """Start the ingestion worker and pick up jobs left unfinished by a previous run"""
+        await self.queue.start()
+        for job in self.jobs.values():
+            if job["status"] in UNFINISHED:
+                logger.info(f"Resuming ingestion job {job['job_id']} at row {job['rows_done']}")
+                job["status"] = "queued"
+                self._save(job)
+                self.queue.submit(self._run, job["job_id"])
+
+    async def shutdown(self, timeout: float = 5.0):
+        # A running job is checkpointed per batch and resumes on the next start
+        await self.queue.shutdown(timeout=timeout)
+
+    # ---- Jobs --------------------------------------------------------------
+
+    async def create_job(self, upload) -> dict:
+        """Stream an UploadFile to disk, validate its header and queue it for ingestion"""
+        job_id = uuid4().hex
+        path = self._csv_path(job_id)
+        total_bytes = 0
+        with open(path, "wb") as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await asyncio.to_thread(f.write, chunk)
+                total_bytes += len(chunk)
+
+        try:
+            with closing(_read_records(path, 0)) as records:
+                header, data_offset = next(records, ([], total_bytes))
+        except UnicodeDecodeError:
+            header, data_offset = None, 0
+        if header is None or not REQUIRED_COLUMNS.issubset(header):
+            os.remove(path)
+            if header is None:
+                raise IngestionError("CSV must be UTF-8 encoded")
+            raise IngestionError(f"CSV must contain 'question' and 'answer' columns. Found: {header}")
+
+        now = datetime.utcnow().isoformat()
+        job = {
+            "job_id": job_id,
+            "filename": upload.filename,
+            "status": "queued",
+            "fieldnames": header,
+            "total_bytes": total_bytes,
+            "bytes_done": data_offset,
+            "rows_done": 0,
+            INSERTED: 0,
+            UPDATED: 0,
+            SKIPPED: 0,
+            "invalid": 0,
+            "error": None,
+            "message": "Queued for ingestion",
+            "created_at": now,
+            "updated_at": now
+        }
+        self.jobs[job_id] = job
+        self._save(job)
+        self.queue.submit(self._run, job_id)
+        logger.info(f"Queued ingestion job {job_id} for '{upload.filename}' ({total_bytes} bytes)")
+        return job
+
+    def resume(self, job_id: str) -> dict:
+        """Queue a failed or interrupted job again from its last checkpoint"""
+        job = self.jobs[job_id]
+        if job["status"] not in ("failed", "interrupted"):
+            raise ValueError(f"Job {job_id} is {job['status']} and cannot be resumed")
+        job["status"] = "queued"
+        job["error"] = None
+        job["message"] = f"Resuming from row {job['rows_done']}"
+        self._save(job)
+        self.queue.submit(self._run, job_id)
+        return job
+
+    def _batches(self, job: dict) -> Iterator[Tuple[list, int, int, int]]:
+        """Group the remaining rows into (pairs, rows, byte offset, invalid rows) batches of at most batch_size pairs"""
+        fieldnames = job["fieldnames"]
+        pairs, rows, invalid = [], 0, 0
+        row_no = job["rows_done"]
+        for record, position in _read_records(self._csv_path(job["job_id"]), job["bytes_done"]):
+            rows += 1
+            row_no += 1
+            row = dict(zip(fieldnames, record))
+            if not (row.get("question") or "").strip() or not (row.get("answer") or "").strip():
+                invalid += 1
+            else:
+                pairs.append((row["question"], row["answer"], str(uuid5(NAMESPACE_URL, f"{job['job_id']}:{row_no}"))))
+            if len(pairs) >= self.batch_size:
+                yield pairs, rows, position, invalid
+                pairs, rows, invalid = [], 0, 0
+        if rows:
+            yield pairs, rows, position, invalid
+
+    async def _plan_batch(self, db, pending: dict, pairs: list, rows: int, position: int, invalid: int) -> dict:
+        """Deduplicate a batch before anything is embedded"""
+        if self.dedup is not None:
+            actions = await self.dedup.plan(db, pairs, pending)
+        else:
+            actions = [(INSERTED, None)] * len(pairs)
+        batch = {
+            "documents": [], "ids": [], "replaced": [], "entries": [],
+            "rows": rows, "position": position,
+            "counts": {INSERTED: 0, UPDATED: 0, SKIPPED: 0, "invalid": invalid}
+        }
+        for (question, answer, doc_id), (action, replaced_id) in zip(pairs, actions):
+            batch["counts"][action] += 1
+            if action == SKIPPED:
+                continue
+            batch["documents"].append(build_document(question, answer))
+            batch["ids"].append(doc_id)
+            batch["entries"].append((question, answer, doc_id, "csv_upload"))
+            if replaced_id is not None:
+                batch["replaced"].append(replaced_id)
+        return batch
+
+    async def _apply_batch(self, batch: dict, replaces: Set[asyncio.Task]):
+        """Embed and add a batch, retire the documents it replaces and record its hashes
+
+        `replaces` are the earlier batches still adding documents this one
+        replaces; the delete and the hash records wait for them, so an old
+        answer can't land in the index after its replacement deleted it.
+        """
+        await asyncio.to_thread(self.index.add_documents, batch["documents"], batch["ids"])
+        if replaces:
+            await asyncio.wait(replaces)
+        if batch["replaced"]:
+            await asyncio.to_thread(self.index.delete, batch["replaced"])
+        if self.dedup is not None:
+            async with AsyncSessionLocal() as db:
+                await self.dedup.record(db, batch["entries"])
+
+    def _checkpoint(self, job: dict, batch: dict):
+        job["rows_done"] += batch["rows"]
+        job["bytes_done"] = batch["position"]
+        for key, count in batch["counts"].items():
+            job[key] += count
+        job["message"] = f"{job[INSERTED]} inserted, {job[UPDATED]} updated, {job[SKIPPED]} skipped so far"
+        self._save(job)
+        if batch["documents"] and self.on_batch is not None:
+            self.on_batch()
+
+    async def _run(self, job_id: str):
+        job = self.jobs[job_id]
+        job["status"] = "running"
+        self._save(job)
+        in_flight = deque()
+        # Batch task adding each document id that is not yet in the index
+        adding: Dict[str, asyncio.Task] = {}
+        db = AsyncSessionLocal()
+        try:
+            # Questions planned in this run but not yet recorded, so repeats across batches are caught
+            pending = {}
+            for pairs, rows, position, invalid in self._batches(job):
+                batch = await self._plan_batch(db, pending, pairs, rows, position, invalid)
+                task = None
+                if batch["documents"]:
+                    replaces = {adding[doc_id] for doc_id in batch["replaced"] if doc_id in adding}
+                    task = asyncio.create_task(self._apply_batch(batch, replaces))
+                    adding.update((doc_id, task) for doc_id in batch["ids"])
+                in_flight.append((task, batch))
+                # Checkpoints only ever advance past batches that are fully in the index
+                while len(in_flight) >= self.concurrency or (in_flight and in_flight[0][0] is None):
+                    await self._finish_oldest(job, in_flight, adding)
+            while in_flight:
+                await self._finish_oldest(job, in_flight, adding)
+        except asyncio.CancelledError:
+            job["status"] = "interrupted"
+            job["message"] = f"Interrupted after row {job['rows_done']}"
+            self._save(job)
+            raise
+        except Exception as e:
+            # Let batches already embedding finish; their rows are re-added idempotently on resume
+            await asyncio.gather(*(task for task, _ in in_flight if task is not None), return_exceptions=True)
+            job["status"] = "failed"
+            job["error"] = str(e)
+            job["message"] = f"Failed after row {job['rows_done']}: {e}"
+            self._save(job)
+            logger.error(f"Ingestion job {job_id} failed at row {job['rows_done']}: {e}", exc_info=True)
+            return
+        finally:
+            await db.close()
+
+        job["status"] = "completed"
+        if job[INSERTED] or job[UPDATED] or job[SKIPPED]:
+            job["message"] = (
+                f"Knowledge base updated: {job[INSERTED]} inserted, {job[UPDATED]} updated, "
+                f"{job[SKIPPED]} skipped as duplicates"
+            )
+        else:
+            job["message"] = "No valid question-answer pairs found in CSV"
+        self._save(job)
+        os.remove(self._csv_path(job_id))
+        logger.info(f"Ingestion job {job_id} completed: {job['message']}")
+
+    async def _finish_oldest(self, job: dict, in_flight: deque, adding: Dict[str, asyncio.Task]):
+        task, batch = in_flight[0]
+        if task is not None:
+            await task
+        in_flight.popleft()
+        for doc_id in batch["ids"]:
+            if adding.get(doc_id) is task:
+                del adding[doc_id]
+        self._checkpoint(job, batch)
+
+    def stats(self) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"jobs": counts, "queue": self.queue.stats()}
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from monitoring import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job queue configuration
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "1000"))
+EVENT_WORKERS = int(os.getenv("EVENT_WORKERS", "8"))
+EVENT_SHUTDOWN_TIMEOUT = float(os.getenv("EVENT_SHUTDOWN_TIMEOUT", "30"))
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted to a queue that is at capacity."""
+
+
+class JobQueue:
+    """Bounded in-process job queue drained by a pool of async workers."""
+
+    def __init__(self, name: str, maxsize: int = EVENT_QUEUE_SIZE, workers: int = EVENT_WORKERS):
+        self.name = name
+        self.maxsize = maxsize
+        self.worker_count = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._busy = 0
+        self._accepting = False
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def start(self):
+        """Start the worker pool. Must be called from a running event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._accepting = True
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"{self.name}-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(f"Started job queue '{self.name}' with {self.worker_count} workers (maxsize={self.maxsize})")
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args, **kwargs):
+        """Enqueue a coroutine function call without waiting for it to run."""
+        if not self._accepting or self._queue is None:
+            raise JobQueueFull(f"Job queue '{self.name}' is not accepting jobs")
+        try:
+            self._queue.put_nowait((func, args, kwargs, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            metrics.record_job_rejected(self.name)
+            raise JobQueueFull(f"Job queue '{self.name}' is full ({self.maxsize} jobs)")
+        self.submitted += 1
+        metrics.record_job_queue_depth(self.name, self._queue.qsize())
+
+    async def _worker(self, index: int):
+        while True:
+            func, args, kwargs, enqueued_at = await self._queue.get()
+            self._busy += 1
+            metrics.record_job_queue_depth(self.name, self._queue.qsize())
+            metrics.record_job_workers_busy(self.name, self._busy)
+            metrics.record_job_wait(self.name, time.monotonic() - enqueued_at)
+            try:
+                await func(*args, **kwargs)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                metrics.record_error("job_failed")
+                logger.error(f"Job in queue '{self.name}' failed: {str(e)}", exc_info=True)
+            finally:
+                self._busy -= 1
+                metrics.record_job_workers_busy(self.name, self._busy)
+                self._queue.task_done()
+
+    async def shutdown(self, timeout: float = EVENT_SHUTDOWN_TIMEOUT):
+        """Stop accepting jobs, drain queued and in-flight jobs, then stop the workers."""
+        if not self._workers:
+            return
+        self._accepting = False
+        logger.info(f"Draining job queue '{self.name}' ({self._queue.qsize()} queued, {self._busy} in flight)")
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Job queue '{self.name}' did not drain within {timeout}s, cancelling remaining jobs")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Job queue '{self.name}' stopped")
+
+    def stats(self) -> dict:
+        """Current queue depth, worker utilisation and job counters."""
+        depth = self._queue.qsize() if self._queue is not None else 0
+        return {
+            "queue_depth": depth,
+            "queue_capacity": self.maxsize,
+            "workers": self.worker_count,
+            "workers_busy": self._busy,
+            "worker_utilisation": self._busy / self.worker_count if self.worker_count else 0.0,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from cache import normalize_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INSERTED = "inserted"
+UPDATED = "updated"
+SKIPPED = "skipped"
+
+ANSWER_SEPARATOR = "\nAnswer: "
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(normalize_text(question).encode("utf-8")).hexdigest()
+
+
+def content_hash(question: str, answer: str) -> str:
+    return hashlib.sha256(f"{normalize_text(question)}\x00{normalize_text(answer)}".encode("utf-8")).hexdigest()
+
+
+def split_document(page_content: str) -> Optional[Tuple[str, str]]:
+    """(question, answer) from a "Question: ...\\nAnswer: ..." knowledge base document"""
+    if not page_content.startswith("Question: ") or ANSWER_SEPARATOR not in page_content:
+        return None
+    question, answer = page_content[len("Question: "):].split(ANSWER_SEPARATOR, 1)
+    return question, answer
+
+
+class KnowledgeDeduplicator:
+    """Content-hash index of the verified knowledge base, checked before anything is embedded.
+
+    Each normalised question maps to the hash of its normalised answer and
+    the id of the document holding it. An identical pair is skipped; a new
+    answer to a known question replaces the old document.
+    """
+
+    async def plan(
+        self,
+        db: AsyncSession,
+        pairs: Sequence[Tuple[str, str, str]],
+        pending: Optional[Dict[str, Tuple[str, str]]] = None
+    ) -> List[Tuple[str, Optional[str]]]:
+        """Decide (action, id of the document it replaces) for each (question, answer, doc_id).
+
+        `pending` holds question hash -> (content hash, doc id) for pairs
+        planned earlier but not yet recorded; it is updated in place so
+        repeated questions within and across batches are caught too.
+        """
+        pending = {} if pending is None else pending
+        hashes = [(question_hash(question), content_hash(question, answer)) for question, answer, _ in pairs]
+        lookup = list({q_hash for q_hash, _ in hashes if q_hash not in pending})
+        existing = {}
+        if lookup:
+            result = await db.execute(
+                select(models.KnowledgeEntry.question_hash, models.KnowledgeEntry.content_hash, models.KnowledgeEntry.doc_id)
+                .where(models.KnowledgeEntry.question_hash.in_(lookup))
+            )
+            existing = {row.question_hash: (row.content_hash, row.doc_id) for row in result}
+
+        actions = []
+        for (q_hash, c_hash), (_, _, doc_id) in zip(hashes, pairs):
+            previous = pending.get(q_hash) or existing.get(q_hash)
+            if previous is None:
+                actions.append((INSERTED, None))
+            elif previous[0] == c_hash:
+                actions.append((SKIPPED, None))
+                continue
+            else:
+                actions.append((UPDATED, previous[1]))
+            pending[q_hash] = (c_hash, doc_id)
+        return actions
+
+    async def record(self, db: AsyncSession, entries: Sequence[Tuple[str, str, str, str]]):
+        """Store (question, answer, doc_id, source) once the documents are in the index"""
+        for question, answer, doc_id, source in entries:
+            await db.merge(models.KnowledgeEntry(
+                question_hash=question_hash(question),
+                content_hash=content_hash(question, answer),
+                doc_id=doc_id,
+                source=source
+            ))
+        await db.commit()
+
+    async def backfill(self, index, db: AsyncSession) -> int:
+        """Build the hash table from an index that predates it, removing exact duplicate documents.
+
+        Only runs while the table is empty. Where one question has several
+        different answers, all are kept and the newest becomes the one that
+        future answers replace.
+        """
+        if await db.scalar(select(models.KnowledgeEntry.question_hash).limit(1)) is not None:
+            return 0
+        # Reading and hashing the whole index is CPU-bound, so it runs off the event loop
+        newest, duplicates = await asyncio.to_thread(self._scan, index)
+        if duplicates:
+            await asyncio.to_thread(index.delete, duplicates)
+            logger.info(f"Removed {len(duplicates)} duplicate documents from the knowledge base")
+        try:
+            db.add_all(
+                models.KnowledgeEntry(question_hash=q_hash, content_hash=c_hash, doc_id=doc_id, source=source)
+                for q_hash, (_, doc_id, c_hash, source) in newest.items()
+            )
+            await db.commit()
+        except IntegrityError:
+            # Another worker backfilled at the same time
+            await db.rollback()
+            return 0
+        logger.info(f"Backfilled {len(newest)} knowledge base content hashes")
+        return len(newest)
+
+    @staticmethod
+    def _scan(index) -> Tuple[Dict[str, Tuple[str, str, str, Optional[str]]], List[str]]:
+        """(question hash -> newest (timestamp, doc id, content hash, source), ids of exact duplicates)"""
+        by_content: Dict[str, Tuple[str, str, str, str]] = {}  # content hash -> (timestamp, doc id, question, source)
+        duplicates = []
+        for doc_id, doc in index.iter_documents():
+            parsed = split_document(doc.page_content)
+            if parsed is None:
+                continue
+            question, answer = parsed
+            c_hash = content_hash(question, answer)
+            candidate = (doc.metadata.get("timestamp", ""), doc_id, question, doc.metadata.get("source"))
+            previous = by_content.get(c_hash)
+            if previous is not None:
+                # Keep the newest copy of an identical pair
+                older, candidate = sorted([previous, candidate])
+                duplicates.append(older[1])
+            by_content[c_hash] = candidate
+
+        newest: Dict[str, Tuple[str, str, str, Optional[str]]] = {}  # question hash -> (timestamp, doc id, content hash, source)
+        for c_hash, (timestamp, doc_id, question, source) in by_content.items():
+            q_hash = question_hash(question)
+            if q_hash not in newest or timestamp > newest[q_hash][0]:
+                newest[q_hash] = (timestamp, doc_id, c_hash, source)
+        return newest, duplicates
+
+
+knowledge_dedup = KnowledgeDeduplicator()
@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from monitoring import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Threads for blocking work (asyncio.to_thread, run_in_executor and LangChain's sync fallbacks)
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+# Event loop lag monitoring
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))  # seconds between heartbeats
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))  # lag in seconds that counts as blocked
+STACK_LIMIT = 30  # innermost frames logged for a blocked loop
+
+
+def install_blocking_pool(size: int = BLOCKING_POOL_SIZE) -> ThreadPoolExecutor:
+    """Make a pool of `size` threads the running loop's default executor"""
+    executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="blocking")
+    asyncio.get_running_loop().set_default_executor(executor)
+    logger.info(f"Blocking calls run on a pool of {size} threads")
+    return executor
+
+
+class LoopLagMonitor:
+    """Measures event loop lag and logs the code that blocks the loop.
+
+    A heartbeat task sleeps `interval` seconds at a time; how much later
+    than that it wakes up is the loop lag, recorded as a histogram. A
+    watchdog thread checks the heartbeat, and when the loop has not run it
+    for `threshold` seconds past its due time, logs the current stack of
+    the loop thread (the coroutine or callback that is not yielding) once
+    per stall.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._due = 0.0  # monotonic time the next heartbeat should run by
+        self.stalls = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    async def start(self):
+        """Start monitoring the running loop"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._due = time.monotonic() + self.interval
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-lag-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.to_thread(self._watchdog.join)
+        self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - self._due)
+            self._due = now + self.interval
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            metrics.record_event_loop_lag(lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                metrics.record_event_loop_stall()
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f} ms")
+
+    def _watch(self):
+        reported_due = None
+        while not self._stopped.wait(self.threshold / 2):
+            due = self._due
+            if due == reported_due or time.monotonic() - due < self.threshold:
+                continue
+            # Still blocked: the loop thread's stack shows what is running instead of the heartbeat
+            reported_due = due
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+            logger.warning(
+                f"Event loop blocked for more than {self.threshold * 1000:.0f} ms"
+                f" in task {task.get_name() if task is not None else '(none)'}:\n{stack}"
+            )
+
+    def stats(self) -> dict:
+        return {
+            "last_lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+            "threshold_ms": self.threshold * 1000
+        }
@@ -1,12 +1,10 @@
 import os
+import asyncio
 from fastapi import FastAPI, Request, Form, Depends, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 from fastapi import UploadFile, File, HTTPException
-import csv
-from io import StringIO
 from dotenv import load_dotenv
-from slack_sdk import WebClient
 import logging
 import hmac
 import hashlib
@@ -15,14 +13,37 @@ from datetime import datetime, timedelta
 # from langchain_groq import ChatGroq
 from langchain_openai import OpenAI
 from langchain_core.messages import HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
 import schemas
-from models import get_db
-from typing import List, Dict, Tuple
+from database import AsyncSessionLocal, get_db, close_db
+from job_queue import JobQueue, JobQueueFull
+from cache import (
+    CachedEmbeddings, EmbeddingDiskCache, llm_cache, llm_cache_key,
+    get_cached_llm_response, set_cached_llm_response, invalidate_llm_cache, normalize_text
+)
+from monitoring import metrics
+from flagged_index import FlaggedQuestionIndex
+from migrations import run_migrations
+from flag_classifier import FlagClassifier, classify_with_llm, FLAG_THRESHOLD
+from semantic_cache import SemanticAnswerCache
+from slack_streaming import SlackStreamWriter, SLACK_STREAMING
+from slack_gateway import SlackGateway
+from index_store import DurableFaissIndex, load_vectorstore, SHARED_INDEX
+from ingestion import CsvIngestionManager, IngestionError
+from knowledge_dedup import knowledge_dedup, SKIPPED
+from conversation_store import ConversationStore
+from message_ledger import message_ledger
+from dislikes import DislikeRecorder
+from prompt_builder import ANSWER_PROMPT, PromptAssembler
+from unified_retrieval import UnifiedRetriever, UNIFIED_RETRIEVAL, TIER_GENERATED, TIER_VERIFIED
+from verified_answers import VerifiedAnswerFastPath
+from loop_monitor import LoopLagMonitor, install_blocking_pool
+from embedding_batcher import EmbeddingBatcher
+from single_flight import SingleFlight, SingleFlightTimeout
+from typing import List, Dict, Optional, Tuple
 from uuid import uuid4
 from langchain_core.documents import Document
 from langchain_openai import OpenAI
@@ -30,7 +51,7 @@ from langchain_openai import OpenAIEmbeddings
 from cachetools import TTLCache
 import json
 import time
-import numpy as np
+from functools import partial
 import re
 # Load environment variables
 load_dotenv()
@@ -54,38 +75,218 @@ print("=================================")
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
 
-# Initialize Slack client
-slack_client = WebClient(token=os.getenv("SLACK_BOT_TOKEN"))
+# Initialize Slack client (pooled, rate limited and ordered per channel; connected on startup)
+slack_gateway = SlackGateway(os.getenv("SLACK_BOT_TOKEN"))
 
-# Initialize embeddings and FAISS indexes
-embeddings = GoogleGenerativeAIEmbeddings(
-    model="models/embedding-001",
+# Initialize embeddings (behind the in-memory + disk embedding cache) and FAISS indexes
+EMBEDDING_MODEL = "models/embedding-001"
+embedding_model = GoogleGenerativeAIEmbeddings(
+    model=EMBEDDING_MODEL,
     google_api_key=os.getenv("GOOGLE_API_KEY")
 )
-faiss_index = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
-faiss_index_improved = FAISS.load_local("faiss_index_improved", embeddings, allow_dangerous_deserialization=True)
+# Concurrent question embeddings that miss the cache are sent together as one request,
+# with the query task type so the vectors match embed_query's
+query_batcher = EmbeddingBatcher(
+    lambda texts: asyncio.to_thread(embedding_model.embed_documents, texts, task_type="RETRIEVAL_QUERY"),
+    embedding_model.aembed_query
+)
+embeddings = CachedEmbeddings(
+    embedding_model,
+    model=EMBEDDING_MODEL,
+    disk_cache=EmbeddingDiskCache(),
+    query_batcher=query_batcher
+)
+# The AI-generated knowledge base is read-only at runtime; with several workers it is memory-mapped
+# so they share one copy. nprobe/efSearch are applied if it was converted to an ANN type
+# (python ann_index.py faiss_index --type ...)
+faiss_index = load_vectorstore("faiss_index", embeddings, mmap=SHARED_INDEX)
+# Verified answers change at runtime, so that index is backed by a write-ahead log and snapshots
+# (set FAISS_SHARED_INDEX=true when running several uvicorn/gunicorn workers)
+faiss_index_improved = DurableFaissIndex.load("faiss_index_improved", embeddings)
+# Optionally search both knowledge bases with a single query over one combined index
+unified_retriever = None
+if UNIFIED_RETRIEVAL:
+    unified_retriever = UnifiedRetriever.build(faiss_index, faiss_index_improved)
+    # The combined index serves the AI-generated knowledge base from now on; drop the separate copy
+    faiss_index = None
+# Questions almost identical to a verified one get its answer without an LLM call
+verified_fast_path = VerifiedAnswerFastPath(
+    unified_retriever.metric if unified_retriever is not None else faiss_index_improved.vectorstore.index.metric_type
+)
 
 # Initialize OpenAI LLM
 llm = OpenAI()
 
+# Answer chain built once from the precompiled prompt; context is fitted to a token budget per request
+answer_chain = ANSWER_PROMPT | llm
+prompt_assembler = PromptAssembler()
+
+# Answers to recent questions, reused for near-duplicate phrasings
+semantic_cache = SemanticAnswerCache()
+
+# Recent turns of active Slack threads
+conversation_store = ConversationStore()
 
+# Resident similarity index over flagged question embeddings
+flagged_index = FlaggedQuestionIndex()
+# How often the index picks up questions flagged or answered through other workers (0 disables)
+FLAGGED_INDEX_REFRESH_INTERVAL = float(os.getenv("FLAGGED_INDEX_REFRESH_INTERVAL", "5"))
+flagged_index_refresh: Optional[asyncio.Task] = None
 
-# Get bot's user ID
-try:
-    BOT_ID = slack_client.auth_test()['user_id']
-    print(f"\n=== Bot Initialization ===")
-    print(f"Bot ID: {BOT_ID}")
-    print("==========================")
-    logger.info(f"Bot ID: {BOT_ID}")
-except Exception as e:
-    logger.error(f"Failed to get bot ID: {e}")
-    BOT_ID = None
+# Thumbs-down reactions merged into existing flagged questions where possible
+dislike_recorder = DislikeRecorder(flagged_index)
+
+# Local flagged-content classifier; falls back to the LLM only when uncertain
+flag_classifier = FlagClassifier(flagged_index, partial(classify_with_llm, llm))
+
+# Identical questions asked at the same time share one flag check and one LLM call
+flag_flight = SingleFlight("flag_check")
+llm_flight = SingleFlight("llm")
+
+
+# Bot's user ID, looked up on startup
+BOT_ID = None
 
 # Global state
 message_counts = {}
 welcome_messages = {}
 processed_messages = TTLCache(maxsize=10000, ttl=86400)
 
+# Background processing of Slack events so the endpoint can ack within Slack's 3s deadline
+ASYNC_EVENT_PROCESSING = os.getenv("ASYNC_EVENT_PROCESSING", "true").lower() == "true"
+event_queue = JobQueue("slack_events")
+
+# Measures how long the event loop is blocked and logs what blocks it
+loop_monitor = LoopLagMonitor()
+
+# CSV uploads are ingested in the background, checkpointed so they can resume after a failure
+csv_ingestion = CsvIngestionManager(faiss_index_improved, knowledge_dedup)
+
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    """Size the thread pool for blocking calls and start watching event loop lag"""
+    install_blocking_pool()
+    await loop_monitor.start()
+
+
+@app.on_event("startup")
+async def apply_migrations():
+    """Bring stored data up to the current format before anything reads it"""
+    await asyncio.to_thread(run_migrations)
+
+
+@app.on_event("startup")
+async def watch_verified_answers():
+    """Forget cached answers whenever the verified knowledge base changes, in this worker or another"""
+    loop = asyncio.get_running_loop()
+    # Listeners run in whichever thread applied the change; the caches are only touched on the loop
+    faiss_index_improved.add_listener(lambda *_: loop.call_soon_threadsafe(invalidate_answer_caches))
+
+
+@app.on_event("startup")
+async def backfill_knowledge_hashes():
+    """Hash the verified knowledge base once so duplicate answers are detected before embedding"""
+    async with AsyncSessionLocal() as db:
+        await knowledge_dedup.backfill(faiss_index_improved, db)
+
+
+@app.on_event("startup")
+async def load_flagged_questions():
+    """Load flagged question embeddings into the resident similarity index and keep it in sync"""
+    global flagged_index_refresh
+    async with AsyncSessionLocal() as db:
+        await load_flagged_index(db)
+    if FLAGGED_INDEX_REFRESH_INTERVAL > 0:
+        flagged_index_refresh = asyncio.create_task(refresh_flagged_index(), name="flagged-index-refresh")
+
+
+@app.on_event("shutdown")
+async def stop_flagged_index_refresh():
+    if flagged_index_refresh is not None:
+        flagged_index_refresh.cancel()
+        try:
+            await flagged_index_refresh
+        except asyncio.CancelledError:
+            pass
+
+
+@app.on_event("startup")
+async def prune_message_ledger():
+    """Drop answered messages past their retention period"""
+    async with AsyncSessionLocal() as db:
+        await message_ledger.prune(db)
+
+
+@app.on_event("startup")
+async def start_slack_gateway():
+    """Open the Slack connection pool and get the bot's user ID"""
+    global BOT_ID
+    await slack_gateway.start()
+    try:
+        BOT_ID = (await slack_gateway.auth_test())['user_id']
+        print(f"\n=== Bot Initialization ===")
+        print(f"Bot ID: {BOT_ID}")
+        print("==========================")
+        logger.info(f"Bot ID: {BOT_ID}")
+    except Exception as e:
+        logger.error(f"Failed to get bot ID: {e}")
+        BOT_ID = None
+
+
+@app.on_event("startup")
+async def start_event_queue():
+    """Start the Slack event worker pool"""
+    if ASYNC_EVENT_PROCESSING:
+        await event_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_event_queue():
+    """Drain in-flight Slack events before the server exits"""
+    await event_queue.shutdown()
+
+
+@app.on_event("shutdown")
+async def stop_slack_gateway():
+    """Deliver queued Slack replies once event processing has drained"""
+    await slack_gateway.shutdown()
+
+
+@app.on_event("startup")
+async def start_csv_ingestion():
+    """Start the CSV ingestion worker and resume unfinished uploads"""
+    await csv_ingestion.start()
+
+
+@app.on_event("shutdown")
+async def stop_csv_ingestion():
+    """Stop ingestion at the next batch; the job resumes on the next start"""
+    await csv_ingestion.shutdown()
+
+
+@app.on_event("startup")
+async def start_index_maintenance():
+    """Snapshot the improved FAISS index in the background (and pick up other workers' changes)"""
+    faiss_index_improved.start()
+
+
+@app.on_event("shutdown")
+async def stop_index_maintenance():
+    """Snapshot any logged index changes before the server exits"""
+    await faiss_index_improved.stop()
+
+
+@app.on_event("shutdown")
+async def close_database():
+    """Close pooled database connections once the background workers have stopped"""
+    await close_db()
+
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    await loop_monitor.stop()
+
 
 def verify_slack_signature(request_body: str, timestamp: str, signature: str) -> bool:
     """Verify the request signature from Slack"""
@@ -102,234 +303,272 @@ def verify_slack_signature(request_body: str, timestamp: str, signature: str) ->
     # Compare the signatures
     return hmac.compare_digest(my_signature, signature)
 
-def is_flagged_question(text: str) -> bool:
+def response_text(response) -> str:
+    """Text of an LLM response (chat models return a message, completion models a string)"""
+    return getattr(response, "content", response)
+
+def is_flagged_question(text: str, query_embedding: List[float]) -> bool:
     """Check if the given text is asking about a flagged question"""
     try:
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                """You are a classifier that determines if a user's question is asking about flagged or disliked content.
-                Return ONLY the number 1 if the question is asking about flagged/disliked content, or 0 if it's not.
-                DO NOT return any other text or explanation."""
-            ),
-            ("human", "{question}")
-        ])
-        
-        chain = prompt | llm
-        response = chain.invoke({"question": text})
-        return response.content.strip() == "1"
+        return flag_classifier.classify(text, query_embedding)
     except Exception as e:
         print(f"Error in is_flagged_question: {e}")
         return False
 
 
-def get_conversation_history(thread_id: str, db: Session) -> List[Dict[str, str]]:
-    """Retrieve conversation history for a thread"""
+async def get_conversation_history(thread_id: str, db: AsyncSession) -> List[Dict[str, str]]:
+    """Retrieve the recent conversation history for a thread"""
     try:
-        history = db.query(models.ConversationHistory).filter(
-            models.ConversationHistory.thread_id == thread_id
-        ).first()
-        
-        if history and history.conversation:
-            return json.loads(history.conversation)
-        return []
+        return await conversation_store.get_recent(db, thread_id)
     except Exception as e:
         logger.error(f"Error retrieving conversation history: {e}")
         return []
 
-def update_conversation_history(thread_id: str, human_msg: str, ai_response: str, db: Session):
-    """Update or create conversation history for a thread"""
+async def update_conversation_history(thread_id: str, human_msg: str, ai_response: str, db: AsyncSession):
+    """Append an exchange to the conversation history for a thread"""
     try:
-        # Get existing history
-        history_record = db.query(models.ConversationHistory).filter(
-            models.ConversationHistory.thread_id == thread_id
-        ).first()
-        
-        # New exchange
-        new_exchange = {"Human": human_msg, "AI": ai_response}
-        
-        if history_record:
-            # Update existing record
-            conversation = json.loads(history_record.conversation)
-            conversation.append(new_exchange)
-            history_record.conversation = json.dumps(conversation)
-        else:
-            # Create new record
-            conversation = [new_exchange]
-            new_record = models.ConversationHistory(
-                thread_id=thread_id,
-                conversation=json.dumps(conversation)
-            )
-            db.add(new_record)
-        
-        db.commit()
+        await conversation_store.append(db, thread_id, human_msg, ai_response)
     except Exception as e:
         logger.error(f"Error updating conversation history: {e}")
-        db.rollback()
+        await db.rollback()
 
-def find_similar_flagged_questions(text: str, db: Session, threshold: float = 0.8) -> List[Tuple[models.FlaggedQuestion, float]]:
-    """Find similar flagged questions using cosine similarity"""
-    try:
-        # Get embedding for the input text
-        query_embedding = embeddings.embed_query(text)
-        
-        # Get all flagged questions with embeddings
-        flagged_questions = db.query(models.FlaggedQuestion).filter(
+async def load_flagged_index(db: AsyncSession):
+    """Build the in-memory flagged question index from the database"""
+    result = await db.execute(
+        select(models.FlaggedQuestion.id, models.FlaggedQuestion.question_embedding).where(
             models.FlaggedQuestion.question_embedding.isnot(None)
-        ).all()
-        
-        similar_questions = []
-        for question in flagged_questions:
-            # Convert stored embedding from JSON string to numpy array
-            stored_embedding = np.array(json.loads(question.question_embedding))
-            query_embedding_np = np.array(query_embedding)
-            
-            # Calculate cosine similarity
-            similarity = np.dot(query_embedding_np, stored_embedding) / (
-                np.linalg.norm(query_embedding_np) * np.linalg.norm(stored_embedding)
+        )
+    )
+    rows = result.all()
+    await asyncio.to_thread(
+        flagged_index.build, ((row.id, models.blob_to_embedding(row.question_embedding)) for row in rows)
+    )
+
+async def sync_flagged_index(db: AsyncSession) -> Tuple[int, int]:
+    """Add and remove index entries so they match the database; returns (added, removed)"""
+    # Read the index first: a question this worker adds afterwards is already committed, so it is never removed here
+    indexed = flagged_index.ids()
+    stored = set((await db.scalars(
+        select(models.FlaggedQuestion.id).where(models.FlaggedQuestion.question_embedding.isnot(None))
+    )).all())
+    removed = indexed - stored
+    for question_id in removed:
+        flagged_index.remove(question_id)
+    added = stored - indexed
+    if added:
+        result = await db.execute(
+            select(models.FlaggedQuestion.id, models.FlaggedQuestion.question_embedding).where(
+                models.FlaggedQuestion.id.in_(added)
             )
-            
-            if similarity >= threshold:
-                similar_questions.append((question, float(similarity)))
+        )
+        for row in result:
+            flagged_index.add(row.id, models.blob_to_embedding(row.question_embedding))
+    return len(added), len(removed)
+
+async def refresh_flagged_index():
+    """Pick up flagged questions added or answered through other workers"""
+    while True:
+        await asyncio.sleep(FLAGGED_INDEX_REFRESH_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                added, removed = await sync_flagged_index(db)
+            if added or removed:
+                logger.info(f"Flagged question index synced: {added} added, {removed} removed")
+        except Exception as e:
+            logger.error(f"Error refreshing flagged question index: {e}")
+
+async def find_similar_flagged_questions(query_embedding: List[float], db: AsyncSession, threshold: float = FLAG_THRESHOLD) -> List[Tuple[models.FlaggedQuestion, float]]:
+    """Find similar flagged questions using cosine similarity against a precomputed query embedding"""
+    try:
+        # Top 5 matches above the threshold from the resident index
+        matches = await asyncio.to_thread(flagged_index.search, query_embedding, threshold=threshold, k=5)
+        if not matches:
+            return []
         
-        # Sort by similarity score and get top 5
-        similar_questions.sort(key=lambda x: x[1], reverse=True)
-        return similar_questions[:5]
+        # Only the matching rows are loaded from the database
+        rows = (await db.scalars(
+            select(models.FlaggedQuestion).where(
+                models.FlaggedQuestion.id.in_([question_id for question_id, _ in matches])
+            )
+        )).all()
+        rows_by_id = {row.id: row for row in rows}
+        return [(rows_by_id[question_id], similarity) for question_id, similarity in matches if question_id in rows_by_id]
     except Exception as e:
         print(f"Error in find_similar_flagged_questions: {e}")
         return []
 
-async def get_llm_response(text: str, db: Session, thread_id: str = None) -> str:
-    """Get response from LLM with context from FAISS indexes and conversation history"""
+async def check_flagged(text: str, query_embedding: List[float]) -> bool:
+    """Flag check for a question, shared with concurrent checks of the same normalised text"""
+    check = lambda: asyncio.to_thread(is_flagged_question, text, query_embedding)
+    try:
+        return await flag_flight.do((flagged_index.version, normalize_text(text)), check)
+    except SingleFlightTimeout:
+        return await check()
+
+async def retrieve_context(text: str, db: AsyncSession) -> Dict:
+    """Run the retrieval stages for a question, embedding it only once.
+
+    The flagged-content classifier, the flagged-question lookup and both FAISS
+    searches share the same query vector and run concurrently.
+    """
+    query_embedding = await embeddings.aembed_query(text)
+    if unified_retriever is not None:
+        is_flagged, similar_flagged, results = await asyncio.gather(
+            check_flagged(text, query_embedding),
+            find_similar_flagged_questions(query_embedding, db),
+            asyncio.to_thread(unified_retriever.search_with_score, query_embedding, k=2)
+        )
+        regular_docs = [doc for doc, _ in results[TIER_GENERATED]]
+        improved_hits = results[TIER_VERIFIED]
+    else:
+        is_flagged, similar_flagged, regular_docs, improved_hits = await asyncio.gather(
+            check_flagged(text, query_embedding),
+            find_similar_flagged_questions(query_embedding, db),
+            asyncio.to_thread(faiss_index.similarity_search_by_vector, query_embedding, k=2),
+            asyncio.to_thread(faiss_index_improved.similarity_search_with_score_by_vector, query_embedding, k=2)
+        )
+    return {
+        "is_flagged": is_flagged,
+        "query_embedding": query_embedding,
+        "similar_flagged": similar_flagged,
+        "regular_docs": regular_docs,
+        "improved_docs": [doc for doc, _ in improved_hits],
+        "improved_hits": improved_hits
+    }
+
+async def get_llm_response(text: str, db: AsyncSession, thread_id: str = None, stream_writer: SlackStreamWriter = None) -> str:
+    """Get response from LLM with context from FAISS indexes and conversation history
+
+    When a stream_writer is given, generated tokens are pushed to it as they
+    arrive; the returned string is always the complete final answer.
+    """
     try:
         print("\n=== Starting LLM Response Function ===")
         
-        # Get conversation history if thread_id is provided
-        history_context = ""
-        if thread_id:
-            conversation_history = get_conversation_history(thread_id, db)
-            if conversation_history:
-                # Get last 5 exchanges
-                recent_history = conversation_history[-5:]
-                history_context = "\n=== PREVIOUS CONVERSATION HISTORY (Last 5 exchanges) ===\n"
-                for exchange in recent_history:
-                    history_context += f"Human: {exchange['Human']}\nAI: {exchange['AI']}\n"
-                history_context += "====================\n"
+        # Get conversation history (last 5 exchanges) if thread_id is provided
+        conversation_history = await get_conversation_history(thread_id, db) if thread_id else []
+        
+        # Embed the question once and run the retrieval stages concurrently
+        retrieval = await retrieve_context(text, db)
+        # End the read transaction so no pooled connection is held while the LLM generates
+        await db.commit()
         
         # First, check if this is a flagged question
-        if is_flagged_question(text):
+        if retrieval["is_flagged"]:
             return "I apologize, but I cannot answer this question as it has been flagged for review."
             
         # Check for similar flagged questions
-        similar_flagged = find_similar_flagged_questions(text, db)
-        if similar_flagged:
+        if retrieval["similar_flagged"]:
             return "I apologize, but I cannot answer this question as it is similar to previously flagged content."
         
-        # Query FAISS indexes
-        regular_docs = faiss_index.similarity_search(text, k=2)
-        improved_docs = faiss_index_improved.similarity_search(text, k=2)
+        regular_docs = retrieval["regular_docs"]
+        improved_docs = retrieval["improved_docs"]
+        query_embedding = retrieval["query_embedding"]
+        
+        # A question that is almost identical to a verified one gets the verified answer,
+        # but only when there is no thread history the answer could depend on
+        if not conversation_history:
+            verified_hit = verified_fast_path.match(retrieval["improved_hits"])
+            if verified_hit is not None:
+                answer, relevance = verified_hit
+                print(f"✅ Serving verified answer without the LLM (relevance {relevance:.3f})")
+                if thread_id:
+                    await update_conversation_history(thread_id, text, answer, db)
+                return answer
+        
+        # A near-duplicate of a recently answered question reuses its answer,
+        # under the same condition
+        if not conversation_history:
+            semantic_hit = semantic_cache.lookup(query_embedding)
+            if semantic_hit is not None:
+                answer, similarity = semantic_hit
+                print(f"✅ Serving answer from semantic cache (similarity {similarity:.3f})")
+                if thread_id:
+                    await update_conversation_history(thread_id, text, answer, db)
+                return answer
+        
+        # Fit history and documents into the prompt token budget
+        prompt_inputs, prompt_tokens = prompt_assembler.assemble(text, conversation_history, improved_docs, regular_docs)
+        print(f"Prompt tokens: {prompt_tokens}")
+        
+        # Serve repeated questions with identical context from the response cache
+        cache_key = llm_cache_key(text, improved_docs, regular_docs, prompt_inputs["history_context"])
+        cached_answer = get_cached_llm_response(cache_key)
+        if cached_answer is not None:
+            metrics.record_cache_hit("llm")
+            print("✅ Serving answer from LLM response cache")
+            if not conversation_history:
+                semantic_cache.add(text, query_embedding, cached_answer)
+            if thread_id:
+                await update_conversation_history(thread_id, text, cached_answer, db)
+            return cached_answer
+        metrics.record_cache_miss("llm")
         
-        # Prepare context
-        context_parts = []
-        if history_context:
-            context_parts.append(history_context)
+        async def generate() -> str:
+            metrics.record_llm_request()
+            if stream_writer is not None:
+                # Stream tokens into the Slack placeholder while collecting the full completion
+                chunks = []
+                async for chunk in answer_chain.astream(prompt_inputs):
+                    chunk_text = response_text(chunk)
+                    chunks.append(chunk_text)
+                    await stream_writer.push(chunk_text)
+                completion = "".join(chunks)
+            else:
+                completion = response_text(await answer_chain.ainvoke(prompt_inputs))
             
-        if improved_docs:
-            context_parts.append("\n=== HUMAN VERIFIED ANSWERS (USE THESE FIRST!) ===")
-            for i, doc in enumerate(improved_docs, 1):
-                context_parts.append(f"Verified Answer {i}: {doc.page_content}")
-        
-        if regular_docs:
-            context_parts.append("\n=== AI GENERATED ANSWERS (Only use if verified answers don't help) ===")
-            for i, doc in enumerate(regular_docs, 1):
-                context_parts.append(f"AI Answer {i}: {doc.page_content}")
-        
-        context = "\n".join(context_parts)
-        
-        # Updated prompt with history context
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                """Listen carefully! You have context from THREE SOURCES:
-
-1. CONVERSATION HISTORY (if available):
-{history_context}
-
-2. FROM FAISS_INDEX_IMPROVED (HUMAN VERIFIED DATABASE):
-{improved_answers}
-
-3. FROM FAISS_INDEX (REGULAR DATABASE):
-{regular_answers}
-
-IMPORTANT RULES:
-- Use conversation history to maintain context of the current discussion
-- If you find the same answer in both databases, ALWAYS USE THE ONE FROM FAISS_INDEX_IMPROVED!
-- FAISS_INDEX_IMPROVED answers are human-verified and 100% accurate
-- FAISS_INDEX answers are AI-generated and less reliable
-
-Step by step how to answer:
-1. Consider the conversation history first for context
-2. Then look at FAISS_INDEX_IMPROVED answers
-3. If you find a relevant answer there, USE IT and mention "Based on verified answer from FAISS_INDEX_IMPROVED:"
-4. Only if you don't find anything in FAISS_INDEX_IMPROVED, check FAISS_INDEX
-5. If using FAISS_INDEX, say "Based on AI-generated answer from FAISS_INDEX:"
-6. If nothing relevant in either database, say "No relevant answers found in either database" and answer from your knowledge
-
-Priority: Conversation History > FAISS_INDEX_IMPROVED > FAISS_INDEX"""
-            ),
-            ("human", "{question}")
-        ])
-        
-        chain = prompt | llm
-        
-        # Prepare context strings
-        improved_answers = "No verified answers found."
-        if improved_docs:
-            improved_answers = "\n".join([f"Answer {i+1}: {doc.page_content}" 
-                                       for i, doc in enumerate(improved_docs)])
-
-        regular_answers = "No AI-generated answers found."
-        if regular_docs:
-            regular_answers = "\n".join([f"Answer {i+1}: {doc.page_content}" 
-                                      for i, doc in enumerate(regular_docs)])
-        
-        response = chain.invoke({
-            "history_context": history_context if history_context else "No conversation history available.",
-            "improved_answers": improved_answers,
-            "regular_answers": regular_answers,
-            "question": text
-        })
+            answer = re.sub(r'<think>.*?</think>', '', completion, flags=re.DOTALL).strip()
+            set_cached_llm_response(cache_key, answer)
+            if not conversation_history:
+                semantic_cache.add(text, query_embedding, answer)
+            return answer
+        
+        if conversation_history:
+            answer = await generate()
+        else:
+            # Concurrent requests with the same question and documents wait on one LLM call;
+            # only the first one streams, the others get the finished answer
+            try:
+                answer = await llm_flight.do(cache_key, generate)
+            except SingleFlightTimeout:
+                # Waited too long on another request's call; answer this one on its own
+                answer = await generate()
         
         # Store the conversation
         if thread_id:
-            update_conversation_history(thread_id, text, response.content, db)
+            await update_conversation_history(thread_id, text, answer, db)
         
-        return re.sub(r'<think>.*?</think>', '', response.content, flags=re.DOTALL).strip()
+        return answer
         
     except Exception as e:
         logger.error(f"Error in get_llm_response: {str(e)}")
         return f"I apologize, but I encountered an error: {str(e)}"
 
-def store_flagged_question(question: str, db: Session):
+async def store_flagged_question(question: str, db: AsyncSession):
     """Store a flagged question in the database"""
     try:
         db_question = models.FlaggedQuestion(question=question)
         db.add(db_question)
-        db.commit()
-        db.refresh(db_question)
+        await db.commit()
+        await db.refresh(db_question)
         logger.info(f"Stored flagged question: {question}")
         return db_question
     except Exception as e:
         logger.error(f"Error storing flagged question: {e}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def get_flagged_questions(db: Session) -> List[schemas.FlaggedQuestion]:
+def invalidate_answer_caches():
+    """Forget cached answers once the verified knowledge base changes"""
+    invalidate_llm_cache()
+    semantic_cache.clear()
+
+async def get_flagged_questions(db: AsyncSession) -> List[schemas.FlaggedQuestion]:
     """Get all unanswered flagged questions"""
     try:
-        questions = db.query(models.FlaggedQuestion).filter(
-            models.FlaggedQuestion.is_answered == False
-        ).all()
+        questions = (await db.scalars(
+            select(models.FlaggedQuestion).where(models.FlaggedQuestion.is_answered == False)
+        )).all()
         return questions
     except Exception as e:
         logger.error(f"Error getting flagged questions: {e}")
@@ -341,6 +580,175 @@ async def test_endpoint():
     logger.info("Test endpoint was called!")
     return {"status": "Server is running!"}
 
+@app.get("/stats")
+async def stats():
+    """Runtime statistics for the background workers"""
+    return {
+        "async_event_processing": ASYNC_EVENT_PROCESSING,
+        "event_queue": event_queue.stats(),
+        "embedding_cache": embeddings.stats(),
+        "embedding_batcher": query_batcher.stats(),
+        "llm_cache_size": len(llm_cache),
+        "semantic_cache": semantic_cache.stats(),
+        "conversation_cache": conversation_store.stats(),
+        "faiss_index_improved": faiss_index_improved.stats(),
+        "csv_ingestion": csv_ingestion.stats(),
+        "unified_retrieval": unified_retriever.stats() if unified_retriever is not None else None,
+        "verified_fast_path": verified_fast_path.stats(),
+        "event_loop": loop_monitor.stats(),
+        "slack_gateway": slack_gateway.stats(),
+        "dislikes": dislike_recorder.stats(),
+        "single_flight": {"flag_check": flag_flight.stats(), "llm": llm_flight.stats()}
+    }
+
+async def process_slack_event(event: dict):
+    """Process a verified Slack event (message or reaction)"""
+    event_type = event.get("type")
+
+    # Handle message events
+    if event_type == "message":
+        channel_id = event.get('channel')
+        user_id = event.get('user')
+        text = event.get('text', '')
+        bot_id = event.get('bot_id')
+        message_id = event.get('client_msg_id', '')  # Get message ID
+        
+        print(f"\n=== Message Details ===")
+        print(f"Channel: {channel_id}")
+        print(f"User: {user_id}")
+        print(f"Text: {text}")
+        print(f"Bot ID: {bot_id}")
+        print(f"Message ID: {message_id}")
+        print("=======================")
+        
+        # Skip if message is from a bot or is our own message
+        if bot_id or user_id == BOT_ID:
+            print("Skipping bot message")
+            return
+    
+        # Skip if we've already processed this message
+        if message_id in processed_messages:
+            print(f"Message {message_id} already processed, skipping")
+            return
+        processed_messages[message_id] = True
+        
+        # Process user message
+        if text and user_id and message_id:  # Only process if we have a message ID
+            try:
+                async with AsyncSessionLocal() as db:
+                    thread_ts = event.get('thread_ts', event.get('ts'))  # Use thread_ts if available, else message ts
+                
+                    if SLACK_STREAMING:
+                        # Post a placeholder right away and stream the answer into it
+                        stream_writer = SlackStreamWriter(slack_gateway, channel_id, thread_ts)
+                        await stream_writer.start()
+                        llm_response = await get_llm_response(text, db, thread_ts, stream_writer=stream_writer)
+                        response = await stream_writer.finish(llm_response)
+                    else:
+                        llm_response = await get_llm_response(text, db, thread_ts)
+                    
+                        # Send response
+                        response = await slack_gateway.post_message(
+                            channel=channel_id,
+                            thread_ts=thread_ts,
+                            text=llm_response
+                        )
+                
+                    # Remember the pair under the reply's ts so a reaction to it needs no Slack calls
+                    # (the question's embedding comes from the cache, it was just computed for retrieval)
+                    query_embedding = await embeddings.aembed_query(text)
+                    await message_ledger.record(db, channel_id, response["ts"], thread_ts, text, llm_response, query_embedding)
+                
+                # Add message ID to processed set
+                processed_messages.add(message_id)
+                print(f"✅ Added message {message_id} to processed set")
+                print("✅ Sent response successfully:", response)
+            except Exception as e:
+                print(f"❌ Error sending response: {str(e)}")
+                logger.error(f"Error sending response: {str(e)}", exc_info=True)
+
+    # Handle reaction events
+    elif event_type == "reaction_added":
+        # Skip if reaction is from the bot itself
+        if event.get('user') == BOT_ID:
+            print("Skipping reaction from bot")
+            return
+            
+        if event.get('reaction') == '-1':  # Check for thumbs down reaction
+            item = event.get('item', {})
+            # Only the bot's own answers can be disliked
+            if BOT_ID and event.get('item_user') and event.get('item_user') != BOT_ID:
+                print("Skipping reaction on a message not posted by the bot")
+                return
+            try:
+                async with AsyncSessionLocal() as db:
+                    channel_id, reply_ts = item.get('channel'), item.get('ts')
+                    entry = await message_ledger.lookup(db, channel_id, reply_ts)
+                    if entry is not None:
+                        user_question, bot_response = entry.question, entry.answer
+                        question_embedding = models.blob_to_embedding(entry.question_embedding)
+                        print("✅ Resolved disliked answer from the message ledger")
+                    else:
+                        # Another dislike of an already flagged message needs neither Slack calls nor an embedding
+                        repeated = await dislike_recorder.record_repeat(db, channel_id, reply_ts)
+                        if repeated is not None:
+                            print(f"✅ Flagged question {repeated[0]} now has {repeated[1]} dislikes")
+                            return
+                        
+                        # Answers posted before the ledger existed (or pruned from it) are looked up in Slack
+                        pair = await fetch_thread_pair(channel_id, reply_ts)
+                        if pair is None:
+                            return
+                        user_question, bot_response = pair
+                        
+                        # Generate embedding for the question
+                        try:
+                            question_embedding = await embeddings.aembed_query(user_question)
+                            print("✅ Generated question embedding")
+                        except Exception as e:
+                            print(f"❌ Error generating embedding: {str(e)}")
+                            question_embedding = None
+                    
+                    print(f"\n=== Storing Disliked Q&A Pair ===")
+                    print(f"User Question: {user_question}")
+                    print(f"Bot Response: {bot_response}")
+                    
+                    # Store both question and bot's response, or count the dislike against the same or a near-duplicate question
+                    question_id, dislike_count, merged = await dislike_recorder.record(
+                        db, channel_id, reply_ts, user_question, bot_response, question_embedding
+                    )
+                    if merged:
+                        print(f"✅ Merged dislike into flagged question {question_id} ({dislike_count} dislikes)")
+                    else:
+                        print(f"✅ Successfully stored disliked Q&A pair as flagged question {question_id}")
+            except Exception as e:
+                print(f"❌ Error handling reaction: {str(e)}")
+                logger.error(f"Error handling reaction: {str(e)}", exc_info=True)
+
+async def fetch_thread_pair(channel: str, ts: str) -> Optional[Tuple[str, str]]:
+    """(question, answer) for a reacted-to message, reconstructed from its Slack thread"""
+    # Get the message that was reacted to
+    result = await slack_gateway.conversations_history(
+        channel=channel,
+        latest=ts,
+        limit=1,
+        inclusive=True
+    )
+    if not result['messages']:
+        return None
+    
+    # Get the thread of the message to find both question and answer
+    thread_result = await slack_gateway.conversations_replies(
+        channel=channel,
+        ts=result['messages'][0].get('thread_ts', result['messages'][0].get('ts')),
+        limit=2  # Get both the question and the bot's response
+    )
+    if not thread_result['messages'] or len(thread_result['messages']) < 2:
+        return None
+    user_question = thread_result['messages'][0].get('text', '')  # First message is user's question
+    bot_response = thread_result['messages'][1].get('text', '')   # Second message is bot's response
+    return user_question, bot_response
+
 @app.post("/slack/events")
 async def slack_events(request: Request):
     """Handle Slack events"""
@@ -398,112 +806,17 @@ async def slack_events(request: Request):
             event_type = event.get("type")
             print(f"\nEvent type: {event_type}")
             print(f"Full event details: {event}")
-        
-            # Handle message events
-            if event_type == "message":
-                channel_id = event.get('channel')
-                user_id = event.get('user')
-                text = event.get('text', '')
-                bot_id = event.get('bot_id')
-                message_id = event.get('client_msg_id', '')  # Get message ID
-                
-                print(f"\n=== Message Details ===")
-                print(f"Channel: {channel_id}")
-                print(f"User: {user_id}")
-                print(f"Text: {text}")
-                print(f"Bot ID: {bot_id}")
-                print(f"Message ID: {message_id}")
-                print("=======================")
-                
-                # Skip if message is from a bot or is our own message
-                if bot_id or user_id == BOT_ID:
-                    print("Skipping bot message")
-                    return {"ok": True}
-            
-                # Skip if we've already processed this message
-                if message_id in processed_messages:
-                    print(f"Message {message_id} already processed, skipping")
-                    return {"ok": True}
-                processed_messages[message_id] = True
-                
-                # Process user message
-                if text and user_id and message_id:  # Only process if we have a message ID
-                    try:
-                        db = next(get_db())
-                        thread_ts = event.get('thread_ts', event.get('ts'))  # Use thread_ts if available, else message ts
-                        llm_response = await get_llm_response(text, db, thread_ts)
-                        
-                        # Send response
-                        response = slack_client.chat_postMessage(
-                            channel=channel_id,
-                            thread_ts=thread_ts,
-                            text=llm_response
-                        )
-                        
-                        # Add message ID to processed set
-                        processed_messages.add(message_id)
-                        print(f"✅ Added message {message_id} to processed set")
-                        print("✅ Sent response successfully:", response)
-                    except Exception as e:
-                        print(f"❌ Error sending response: {str(e)}")
-                        logger.error(f"Error sending response: {str(e)}", exc_info=True)
-
-            # Handle reaction events (unchanged from original)
-            elif event_type == "reaction_added":
-                # Skip if reaction is from the bot itself
-                if event.get('user') == BOT_ID:
-                    print("Skipping reaction from bot")
-                    return {"ok": True}
-                    
-                if event.get('reaction') == '-1':  # Check for thumbs down reaction
-                    try:
-                        db = next(get_db())
-                        # Get the message that was reacted to
-                        result = slack_client.conversations_history(
-                            channel=event.get('item', {}).get('channel'),
-                            latest=event.get('item', {}).get('ts'),
-                            limit=1,
-                            inclusive=True
-                        )
-                        
-                        if result['messages']:
-                            # Get the thread of the message to find both question and answer
-                            thread_result = slack_client.conversations_replies(
-                                channel=event.get('item', {}).get('channel'),
-                                ts=result['messages'][0].get('thread_ts', result['messages'][0].get('ts')),
-                                limit=2  # Get both the question and the bot's response
-                            )
-                            
-                            if thread_result['messages'] and len(thread_result['messages']) >= 2:
-                                user_question = thread_result['messages'][0].get('text', '')  # First message is user's question
-                                bot_response = thread_result['messages'][1].get('text', '')   # Second message is bot's response
-                                
-                                print(f"\n=== Storing Disliked Q&A Pair ===")
-                                print(f"User Question: {user_question}")
-                                print(f"Bot Response: {bot_response}")
-                                
-                                # Generate embedding for the question
-                                try:
-                                    question_embedding = embeddings.embed_query(user_question)
-                                    question_embedding_json = json.dumps(question_embedding)
-                                    print("✅ Generated question embedding")
-                                except Exception as e:
-                                    print(f"❌ Error generating embedding: {str(e)}")
-                                    question_embedding_json = None
-                                
-                                # Store both question and bot's response
-                                db_question = models.FlaggedQuestion(
-                                    question=user_question,
-                                    llm_response=bot_response,
-                                    question_embedding=question_embedding_json,
-                                    dislike_count=1
-                                )
-                                db.add(db_question)
-                                db.commit()
-                                print("✅ Successfully stored disliked Q&A pair with embedding")
-                    except Exception as e:
-                        print(f"❌ Error handling reaction: {str(e)}")
-                        logger.error(f"Error handling reaction: {str(e)}", exc_info=True)
+
+            if ASYNC_EVENT_PROCESSING:
+                # Acknowledge right away and let the worker pool do the slow part
+                try:
+                    event_queue.submit(process_slack_event, event)
+                except JobQueueFull as e:
+                    logger.warning(f"Rejecting Slack event, {str(e)}")
+                    raise HTTPException(status_code=503, detail="Event queue is full")
+                print(f"✅ Queued {event_type} event for background processing")
+            else:
+                await process_slack_event(event)
             
             return {"ok": True}
 
@@ -512,6 +825,8 @@ async def slack_events(request: Request):
             logger.error(f"Error parsing JSON: {str(e)}", exc_info=True)
             return {"error": "Invalid JSON"}
             
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error processing event: {str(e)}")
         logger.error(f"Error processing event: {str(e)}", exc_info=True)
@@ -526,7 +841,7 @@ async def test_events():
         print(f"Posting to channel: {channel_id}")
         
         # Send a test message
-        response = slack_client.chat_postMessage(
+        response = await slack_gateway.post_message(
             channel=channel_id,
             text="🔍 Testing events... You should see the bot respond to this!"
         )
@@ -551,9 +866,9 @@ async def test_events():
 
 
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
+async def dashboard(request: Request, db: AsyncSession = Depends(get_db)):
     """Display the dashboard of flagged questions"""
-    questions = get_flagged_questions(db)
+    questions = await get_flagged_questions(db)
     return templates.TemplateResponse(
         "dashboard.html",
         {"request": request, "questions": questions}
@@ -573,103 +888,86 @@ async def dashboard(request: Request):
 
 @app.post("/addKnowledge")
 async def add_knowledge_csv(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(...)
 ):
     """
     API endpoint to upload a CSV file with question-answer pairs and store them in FAISS improved index
     CSV format should have two columns: 'question' and 'answer'
+    The file is ingested by a background job; poll /addKnowledge/jobs/{job_id} for progress
     """
     try:
         # Validate file type
         if not file.filename.endswith('.csv'):
             raise HTTPException(status_code=400, detail="Please upload a CSV file")
 
-        # Read the uploaded file
-        contents = await file.read()
-        # Decode with utf-8-sig to handle BOM
-        csv_string = contents.decode('utf-8-sig')  # Use 'utf-8-sig' instead of 'utf-8'
-        
-        # Parse CSV
-        csv_file = StringIO(csv_string)
-        csv_reader = csv.DictReader(csv_file)
-        
-        # Log the fieldnames for debugging
-        logger.debug(f"CSV fieldnames: {csv_reader.fieldnames}")
-        
-        # Validate CSV headers
-        if not {'question', 'answer'}.issubset(set(csv_reader.fieldnames)):
-            raise HTTPException(
-                status_code=400,
-                detail=f"CSV must contain 'question' and 'answer' columns. Found: {csv_reader.fieldnames}"
-            )
-
-        # Prepare documents for FAISS
-        documents = []
-        for row in csv_reader:
-            # Skip empty rows
-            if not row['question'].strip() or not row['answer'].strip():
-                continue
-                
-            # Create combined text for embedding
-            combined_text = f"""Question: {row['question']}
-Answer: {row['answer']}"""
-            
-            # Create Document object
-            document = Document(
-                page_content=combined_text,
-                metadata={
-                    "source": "csv_upload",
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "original_question": row['question']
-                }
-            )
-            documents.append(document)
-
-        if not documents:
-            raise HTTPException(status_code=400, detail="No valid question-answer pairs found in CSV")
-
-        # Generate UUIDs for all documents
-        doc_ids = [str(uuid4()) for _ in range(len(documents))]
-        
-        # Store in FAISS improved index
-        try:
-            logger.info(f"Adding {len(documents)} question-answer pairs to FAISS improved index")
-            faiss_index_improved.add_documents(documents=documents, ids=doc_ids)
-            faiss_index_improved.save_local("faiss_index_improved")
-            
-            logger.info(f"Successfully stored {len(documents)} question-answer pairs")
-            return {
-                "status": "success",
-                "message": f"Successfully added {len(documents)} question-answer pairs to knowledge base",
-                "count": len(documents)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error storing documents in FAISS: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error storing in FAISS: {str(e)}")
+        # Stream the upload to disk and ingest it in the background
+        job = await csv_ingestion.create_job(file)
+        return {
+            "status": "accepted",
+            "job_id": job["job_id"],
+            "message": f"Upload received, adding question-answer pairs in the background (job {job['job_id']})"
+        }
 
+    except IngestionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing CSV upload: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
     finally:
         await file.close()
 
+
+@app.get("/addKnowledge/jobs")
+async def list_ingestion_jobs():
+    """All CSV ingestion jobs, newest first"""
+    return csv_ingestion.list_jobs()
+
+
+@app.get("/addKnowledge/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """Progress of a CSV ingestion job"""
+    job = csv_ingestion.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/addKnowledge/jobs/{job_id}/resume")
+async def resume_ingestion_job(job_id: str):
+    """Resume a failed or interrupted CSV ingestion job from its last checkpoint"""
+    if csv_ingestion.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        csv_ingestion.resume(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return csv_ingestion.status(job_id)
+
 @app.post("/submit_answer")
 async def submit_answer(
     answer_data: schemas.AnswerCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Handle submission of answers to flagged questions"""
     try:
         # Get the question from the database
-        question = db.query(models.FlaggedQuestion).filter(
-            models.FlaggedQuestion.id == answer_data.question_id
-        ).first()
+        question = await db.get(models.FlaggedQuestion, answer_data.question_id)
         
         if not question:
             raise HTTPException(status_code=404, detail="Question not found")
         
+        # Generate UUID for the document
+        doc_uuid = str(uuid4())
+        
+        # Skip the embedding entirely if this exact answer is already in the knowledge base
+        (action, replaced_id), = await knowledge_dedup.plan(db, [(question.question, answer_data.correct_answer, doc_uuid)])
+        
         # Create combined text for embedding
         combined_text = f"""Question: {question.question}
 Answer: {answer_data.correct_answer}"""
@@ -680,40 +978,41 @@ Answer: {answer_data.correct_answer}"""
             metadata={
                 "source": "human_verified",
                 "question_id": str(question.id),
+                "original_question": question.question,
                 "timestamp": datetime.utcnow().isoformat()
             }
         )
         
-        # Generate UUID for the document
-        doc_uuid = str(uuid4())
-        
         # Store in improved FAISS index
         try:
-            print(f"Adding to improved index with UUID {doc_uuid}:")
-            print(f"Content: {combined_text}")
-            print(f"Metadata: {document.metadata}")
-            
-            # Add document to FAISS
-            faiss_index_improved.add_documents(documents=[document], ids=[doc_uuid])
-            
-            # Save the updated index
-            faiss_index_improved.save_local("faiss_index_improved")
+            if action != SKIPPED:
+                print(f"Adding to improved index with UUID {doc_uuid} ({action}):")
+                print(f"Content: {combined_text}")
+                print(f"Metadata: {document.metadata}")
+                
+                # Add document to FAISS (logged durably; snapshots are written in the background)
+                await asyncio.to_thread(faiss_index_improved.add_documents, documents=[document], ids=[doc_uuid])
+                if replaced_id is not None:
+                    # The question had a different answer before; retire the old one
+                    await asyncio.to_thread(faiss_index_improved.delete, [replaced_id])
+                await knowledge_dedup.record(db, [(question.question, answer_data.correct_answer, doc_uuid, "human_verified")])
             
             # Remove the question from the database after storing it in FAISS
-            db.delete(question)
-            db.commit()
+            await db.delete(question)
+            await db.commit()
+            flagged_index.remove(answer_data.question_id)
             
-            logger.info(f"Stored answer and updated FAISS index for question ID {answer_data.question_id}, question removed from DB")
-            return {"status": "success"}
+            logger.info(f"Stored answer ({action}) for question ID {answer_data.question_id}, question removed from DB")
+            return {"status": "success", "result": action}
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error updating FAISS index: {e}")
             raise HTTPException(status_code=500, detail=str(e))
             
     except Exception as e:
         logger.error(f"Error storing answer: {e}")
-        db.rollback()
+        await db.rollback()
         return {"status": "error", "message": str(e)}
 
 
@@ -721,23 +1020,18 @@ Answer: {answer_data.correct_answer}"""
 @app.post("/record_dislike/{question_id}")
 async def record_dislike(
     question_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Record a dislike for a question/answer pair"""
     try:
-        question = db.query(models.FlaggedQuestion).filter(
-            models.FlaggedQuestion.id == question_id
-        ).first()
+        updated = await dislike_recorder.increment(db, models.FlaggedQuestion.id == question_id)
         
-        if not question:
+        if updated is None:
             raise HTTPException(status_code=404, detail="Question not found")
         
-        question.dislike_count += 1
-        db.commit()
-        
-        return {"status": "success", "dislike_count": question.dislike_count}
+        return {"status": "success", "dislike_count": updated[1]}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error recording dislike: {e}")
         return {"status": "error", "message": str(e)}
 
@@ -749,13 +1043,13 @@ async def test_bot():
         channel_id = os.getenv("SLACK_CHANNEL_ID")
         print(f"Posting to channel: {channel_id}")
         
-        response = slack_client.chat_postMessage(
+        response = await slack_gateway.post_message(
             channel=channel_id,
             text="🔍 Bot test message - checking if I can post to this channel!"
         )
         
         print(f"Response from Slack: {response}")
-        return {"status": "success", "response": response}
+        return {"status": "success", "response": response.data}
     except Exception as e:
         print(f"❌ Error testing bot: {str(e)}")
         return {"status": "error", "error": str(e)}
@@ -0,0 +1,68 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Days an answered message stays in the ledger (reactions on older answers fall back to Slack)
+LEDGER_RETENTION_DAYS = int(os.getenv("LEDGER_RETENTION_DAYS", "90"))
+
+
+class MessageLedger:
+    """Question, answer and query embedding of every reply the bot posted, keyed by (channel, reply ts).
+
+    A reaction names the message it was added to, so the disliked pair is
+    one lookup on the unique (channel, reply_ts) index: no Slack calls, no
+    guessing which thread messages belong together and no re-embedding.
+    """
+
+    async def record(
+        self,
+        db: AsyncSession,
+        channel: str,
+        reply_ts: str,
+        thread_ts: Optional[str],
+        question: str,
+        answer: str,
+        query_embedding: Optional[Sequence[float]]
+    ):
+        db.add(models.AnsweredMessage(
+            channel=channel,
+            reply_ts=reply_ts,
+            thread_ts=thread_ts,
+            question=question,
+            answer=answer,
+            question_embedding=models.embedding_to_blob(query_embedding) if query_embedding is not None else None
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # The same reply recorded twice (e.g. a redelivered event)
+            await db.rollback()
+
+    async def lookup(self, db: AsyncSession, channel: str, reply_ts: str) -> Optional[models.AnsweredMessage]:
+        return await db.scalar(
+            select(models.AnsweredMessage).where(
+                models.AnsweredMessage.channel == channel,
+                models.AnsweredMessage.reply_ts == reply_ts
+            )
+        )
+
+    async def prune(self, db: AsyncSession, retention_days: int = LEDGER_RETENTION_DAYS) -> int:
+        """Forget answers older than the retention period"""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        result = await db.execute(delete(models.AnsweredMessage).where(models.AnsweredMessage.timestamp < cutoff))
+        await db.commit()
+        if result.rowcount:
+            logger.info(f"Pruned {result.rowcount} answered messages older than {retention_days} days")
+        return result.rowcount
+
+
+message_ledger = MessageLedger()
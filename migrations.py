@@ -0,0 +1,141 @@
+import json
+import logging
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Engine
+from database import engine
+from models import embedding_to_blob
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def migrate_flagged_embeddings(engine: Engine = engine) -> int:
+    """Convert flagged-question embeddings stored as JSON text into float32 blobs.
+
+    Safe to run repeatedly: only rows still holding text are touched. Returns
+    the number of rows converted.
+    """
+    converted = 0
+    if engine.dialect.name == "sqlite":
+        # SQLite keeps the per-value storage class, so blobs can live in the old TEXT column
+        text_filter = "AND typeof(question_embedding) = 'text'"
+    else:
+        text_filter = ""
+    query = text(
+        "SELECT id, question_embedding FROM flagged_questions "
+        f"WHERE id > :last_id AND question_embedding IS NOT NULL {text_filter} "
+        "ORDER BY id LIMIT :limit"
+    )
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(query, {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = []
+            for row_id, value in rows:
+                if not isinstance(value, str):
+                    continue
+                try:
+                    blob = embedding_to_blob(json.loads(value))
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Dropping unreadable embedding for flagged question {row_id}: {e}")
+                    blob = None
+                updates.append({"id": row_id, "blob": blob})
+            if updates:
+                conn.execute(
+                    text("UPDATE flagged_questions SET question_embedding = :blob WHERE id = :id"),
+                    updates
+                )
+                converted += len(updates)
+    if converted:
+        logger.info(f"Converted {converted} flagged question embeddings from JSON to float32 blobs")
+    return converted
+
+
+def migrate_conversation_history(engine: Engine = engine) -> int:
+    """Split whole-thread JSON conversation blobs into one conversation_turns row per exchange.
+
+    Each legacy row is deleted in the same transaction that inserts its
+    turns, so the migration is safe to rerun. Returns the number of threads
+    migrated.
+    """
+    migrated = 0
+    query = text("SELECT id, thread_id, conversation FROM conversation_history ORDER BY id LIMIT :limit")
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(query, {"limit": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+            turns = []
+            for row_id, thread_id, conversation in rows:
+                try:
+                    exchanges = json.loads(conversation) if conversation else []
+                except ValueError as e:
+                    logger.warning(f"Dropping unreadable conversation history {row_id} for thread {thread_id}: {e}")
+                    exchanges = []
+                # Turns written since (e.g. by a worker started earlier) stay after the legacy ones
+                first = conn.execute(
+                    text("SELECT MIN(turn_no) FROM conversation_turns WHERE thread_id = :thread_id"),
+                    {"thread_id": thread_id}
+                ).scalar()
+                start = 1 if first is None else first - len(exchanges)
+                turns.extend(
+                    {
+                        "thread_id": thread_id,
+                        "turn_no": start + offset,
+                        "human": exchange.get("Human", ""),
+                        "ai": exchange.get("AI", "")
+                    }
+                    for offset, exchange in enumerate(exchanges)
+                )
+            if turns:
+                conn.execute(
+                    text(
+                        "INSERT INTO conversation_turns (thread_id, turn_no, human, ai, timestamp) "
+                        "VALUES (:thread_id, :turn_no, :human, :ai, CURRENT_TIMESTAMP)"
+                    ),
+                    turns
+                )
+            conn.execute(
+                text("DELETE FROM conversation_history WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": [row[0] for row in rows]}
+            )
+            migrated += len(rows)
+    if migrated:
+        logger.info(f"Migrated {migrated} conversation threads to one row per turn")
+    return migrated
+
+
+def migrate_flagged_message_columns(engine: Engine = engine) -> bool:
+    """Add the columns identifying the disliked Slack message to a flagged_questions table that predates them.
+
+    create_all only creates missing tables, so existing databases get the
+    columns and their unique index here. Returns whether anything changed.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("flagged_questions")}
+    if "reply_ts" in columns:
+        return False
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE flagged_questions ADD COLUMN channel VARCHAR"))
+        conn.execute(text("ALTER TABLE flagged_questions ADD COLUMN reply_ts VARCHAR"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_flagged_questions_message ON flagged_questions (channel, reply_ts)"
+        ))
+    logger.info("Added channel and reply_ts columns to flagged_questions")
+    return True
+
+
+def run_migrations():
+    """Apply all data migrations."""
+    migrate_flagged_message_columns()
+    migrate_flagged_embeddings()
+    migrate_conversation_history()
+
+
+if __name__ == "__main__":
+    run_migrations()
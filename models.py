@@ -1,31 +1,37 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, LargeBinary, Index
 from datetime import datetime
-import os
+from typing import Optional, Sequence
+import numpy as np
+from database import Base, engine
 
-# Create SQLAlchemy engine
-SQLALCHEMY_DATABASE_URL = "sqlite:///./slack_bot.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+def embedding_to_blob(embedding: Sequence[float]) -> bytes:
+    """Pack an embedding as raw float32 bytes for storage"""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Create Base class
-Base = declarative_base()
+def blob_to_embedding(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """Zero-copy float32 view over a stored embedding blob"""
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype=np.float32)
 
 class FlaggedQuestion(Base):
     __tablename__ = "flagged_questions"
+    __table_args__ = (
+        # One row per disliked Slack message; repeated dislikes increment dislike_count
+        Index("ix_flagged_questions_message", "channel", "reply_ts", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     question = Column(Text, nullable=False)
-    question_embedding = Column(Text, nullable=True)  # To store question embedding as JSON string
+    question_embedding = Column(LargeBinary, nullable=True)  # Question embedding as packed float32 (see embedding_to_blob)
     llm_response = Column(Text, nullable=True)
     correct_answer = Column(Text, nullable=True)
     is_answered = Column(Boolean, default=False)
     dislike_count = Column(Integer, default=0)
     timestamp = Column(DateTime, default=datetime.utcnow)
     embedding_id = Column(String, nullable=True)  # To store FAISS vector ID
+    channel = Column(String, nullable=True)  # Slack message the dislike was added to
+    reply_ts = Column(String, nullable=True)
     
     @property
     def combined_text(self):
@@ -37,6 +43,7 @@ class FlaggedQuestion(Base):
 
 
 class ConversationHistory(Base):
+    """Legacy whole-thread JSON storage, migrated to ConversationTurn on startup"""
     __tablename__ = "conversation_history"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -44,13 +51,45 @@ class ConversationHistory(Base):
     conversation = Column(Text, nullable=False)  # JSON string of conversation list
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+
+class ConversationTurn(Base):
+    __tablename__ = "conversation_turns"
+    __table_args__ = (
+        # Last-N reads and appends for a thread are index range scans
+        Index("ix_conversation_turns_thread_turn", "thread_id", "turn_no", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    thread_id = Column(String, nullable=False)  # Slack thread_ts
+    turn_no = Column(Integer, nullable=False)  # Position of the exchange within the thread
+    human = Column(Text, nullable=False)
+    ai = Column(Text, nullable=False)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+class KnowledgeEntry(Base):
+    __tablename__ = "knowledge_entries"
+
+    question_hash = Column(String(64), primary_key=True)  # sha256 of the normalised question
+    content_hash = Column(String(64), nullable=False)  # sha256 of the normalised question and answer
+    doc_id = Column(String, nullable=False)  # Document id in the improved FAISS index
+    source = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AnsweredMessage(Base):
+    """Ledger of the answers the bot posted, so reactions resolve without calling Slack"""
+    __tablename__ = "answered_messages"
+    __table_args__ = (
+        Index("ix_answered_messages_channel_reply", "channel", "reply_ts", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String, nullable=False)
+    reply_ts = Column(String, nullable=False)  # Slack ts of the bot's reply
+    thread_ts = Column(String, nullable=True)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    question_embedding = Column(LargeBinary, nullable=True)  # Query embedding as packed float32 (see embedding_to_blob)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+
 # Create all tables
 Base.metadata.create_all(bind=engine)
-
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close() 
\ No newline at end of file
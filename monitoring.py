@@ -16,6 +16,33 @@ DB_CONNECTIONS = Gauge('db_connections_current', 'Current number of database con
 CACHE_HITS = Counter('cache_hits_total', 'Total cache hits', ['cache_type'])
 CACHE_MISSES = Counter('cache_misses_total', 'Total cache misses', ['cache_type'])
 ERROR_COUNT = Counter('errors_total', 'Total errors', ['type'])
+JOB_QUEUE_DEPTH = Gauge('job_queue_depth', 'Jobs waiting in the queue', ['queue'])
+JOB_WORKERS_BUSY = Gauge('job_workers_busy', 'Workers currently running a job', ['queue'])
+JOB_WAIT = Histogram('job_wait_seconds', 'Time a job spent queued before a worker picked it up', ['queue'])
+FLAG_CLASSIFICATIONS = Counter('flag_classifications_total', 'Flagged-content verdicts by source', ['source'])
+JOB_REJECTED = Counter('job_rejected_total', 'Jobs rejected because the queue was full', ['queue'])
+PROMPT_TOKENS = Histogram(
+    'llm_prompt_tokens', 'Tokens in each prompt sent to the LLM',
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+)
+PROMPT_PARTS_DROPPED = Counter('llm_prompt_parts_dropped_total', 'History turns and documents left out of prompts to fit the token budget', ['part'])
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds', 'How late the event loop ran a scheduled heartbeat',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+SLACK_API_CALLS = Counter('slack_api_calls_total', 'Slack Web API calls by method and result', ['method', 'result'])
+SLACK_QUEUE_DEPTH = Gauge('slack_outbound_queue_depth', 'Slack messages waiting in per-channel send queues')
+SLACK_QUEUE_WAIT = Histogram('slack_outbound_queue_wait_seconds', 'Time a Slack message waited in its channel queue')
+EMBEDDING_BATCH_SIZE = Histogram(
+    'embedding_batch_size', 'Texts per coalesced embedding request',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+EMBEDDING_BATCH_LATENCY = Histogram('embedding_batch_duration_seconds', 'Duration of coalesced embedding requests')
+EMBEDDING_BATCH_FALLBACKS = Counter('embedding_batch_fallbacks_total', 'Texts re-embedded individually after a batch failed for them')
+SINGLE_FLIGHT_SHARED = Counter('single_flight_shared_total', 'Calls saved by waiting on an identical in-flight call', ['call'])
+SINGLE_FLIGHT_DETACHED = Counter('single_flight_detached_total', 'Requests that timed out waiting on an identical in-flight call', ['call'])
+VERIFIED_FAST_PATH = Counter('verified_fast_path_total', 'Questions checked against verified answers before the LLM, by outcome', ['result'])
+EVENT_LOOP_STALLS = Counter('event_loop_stalls_total', 'Times the event loop was blocked beyond the lag threshold')
 
 class MetricsCollector:
     @staticmethod
@@ -54,6 +81,92 @@ class MetricsCollector:
         """Record error."""
         ERROR_COUNT.labels(type=error_type).inc()
 
+    @staticmethod
+    def record_job_queue_depth(queue: str, depth: int):
+        """Record current job queue depth."""
+        JOB_QUEUE_DEPTH.labels(queue=queue).set(depth)
+
+    @staticmethod
+    def record_job_workers_busy(queue: str, busy: int):
+        """Record number of busy job workers."""
+        JOB_WORKERS_BUSY.labels(queue=queue).set(busy)
+
+    @staticmethod
+    def record_job_wait(queue: str, duration: float):
+        """Record how long a job waited in the queue."""
+        JOB_WAIT.labels(queue=queue).observe(duration)
+
+    @staticmethod
+    def record_job_rejected(queue: str):
+        """Record a job rejected by a full queue."""
+        JOB_REJECTED.labels(queue=queue).inc()
+
+    @staticmethod
+    def record_flag_classification(source: str):
+        """Record which path produced a flagged-content verdict (cache, local or llm)."""
+        FLAG_CLASSIFICATIONS.labels(source=source).inc()
+
+    @staticmethod
+    def record_prompt_tokens(tokens: int):
+        """Record the size of a prompt sent to the LLM."""
+        PROMPT_TOKENS.observe(tokens)
+
+    @staticmethod
+    def record_prompt_part_dropped(part: str, count: int = 1):
+        """Record history turns or documents dropped to fit the prompt budget."""
+        PROMPT_PARTS_DROPPED.labels(part=part).inc(count)
+
+    @staticmethod
+    def record_slack_call(method: str, result: str):
+        """Record a Slack Web API call (ok, error or rate_limited)."""
+        SLACK_API_CALLS.labels(method=method, result=result).inc()
+
+    @staticmethod
+    def record_slack_queue_depth(depth: int):
+        """Record Slack messages waiting to be sent."""
+        SLACK_QUEUE_DEPTH.set(depth)
+
+    @staticmethod
+    def record_slack_queue_wait(duration: float):
+        """Record how long a Slack message waited in its channel queue."""
+        SLACK_QUEUE_WAIT.observe(duration)
+
+    @staticmethod
+    def record_embedding_batch(size: int, duration: float):
+        """Record a coalesced embedding request."""
+        EMBEDDING_BATCH_SIZE.observe(size)
+        EMBEDDING_BATCH_LATENCY.observe(duration)
+
+    @staticmethod
+    def record_embedding_batch_fallback(count: int):
+        """Record texts embedded individually after their batch failed."""
+        EMBEDDING_BATCH_FALLBACKS.inc(count)
+
+    @staticmethod
+    def record_single_flight_shared(call: str):
+        """Record a call saved by sharing an in-flight one."""
+        SINGLE_FLIGHT_SHARED.labels(call=call).inc()
+
+    @staticmethod
+    def record_single_flight_detached(call: str):
+        """Record a request detached from an in-flight call after a timeout."""
+        SINGLE_FLIGHT_DETACHED.labels(call=call).inc()
+
+    @staticmethod
+    def record_verified_fast_path(hit: bool):
+        """Record whether a question was answered from a verified answer without the LLM."""
+        VERIFIED_FAST_PATH.labels(result="hit" if hit else "miss").inc()
+
+    @staticmethod
+    def record_event_loop_lag(lag: float):
+        """Record event loop lag."""
+        EVENT_LOOP_LAG.observe(lag)
+
+    @staticmethod
+    def record_event_loop_stall():
+        """Record an event loop blocked beyond the threshold."""
+        EVENT_LOOP_STALLS.inc()
+
     @staticmethod
     def get_system_metrics():
         """Get current system metrics."""
@@ -0,0 +1,183 @@
+import os
+import logging
+from typing import Dict, List, Sequence, Tuple
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+from monitoring import metrics
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Prompt budget configuration
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "3000"))  # whole prompt, instructions included
+PROMPT_DOC_MAX_TOKENS = int(os.getenv("PROMPT_DOC_MAX_TOKENS", "600"))  # per retrieved document
+PROMPT_TURN_MAX_TOKENS = int(os.getenv("PROMPT_TURN_MAX_TOKENS", "300"))  # per history exchange
+PROMPT_TOKEN_ENCODING = os.getenv("PROMPT_TOKEN_ENCODING", "cl100k_base")
+MIN_PART_TOKENS = 40  # a part that would be cut shorter than this is dropped instead
+TRUNCATION_MARK = " [...]"
+
+NO_HISTORY = "No conversation history available."
+NO_IMPROVED = "No verified answers found."
+NO_REGULAR = "No AI-generated answers found."
+
+# Never changes between requests, so it forms a stable prefix that provider-side prompt caching can reuse
+SYSTEM_INSTRUCTIONS = """Listen carefully! You have context from THREE SOURCES, given after these rules:
+
+1. CONVERSATION HISTORY (if available)
+2. FROM FAISS_INDEX_IMPROVED (HUMAN VERIFIED DATABASE)
+3. FROM FAISS_INDEX (REGULAR DATABASE)
+
+IMPORTANT RULES:
+- Use conversation history to maintain context of the current discussion
+- If you find the same answer in both databases, ALWAYS USE THE ONE FROM FAISS_INDEX_IMPROVED!
+- FAISS_INDEX_IMPROVED answers are human-verified and 100% accurate
+- FAISS_INDEX answers are AI-generated and less reliable
+
+Step by step how to answer:
+1. Consider the conversation history first for context
+2. Then look at FAISS_INDEX_IMPROVED answers
+3. If you find a relevant answer there, USE IT and mention "Based on verified answer from FAISS_INDEX_IMPROVED:"
+4. Only if you don't find anything in FAISS_INDEX_IMPROVED, check FAISS_INDEX
+5. If using FAISS_INDEX, say "Based on AI-generated answer from FAISS_INDEX:"
+6. If nothing relevant in either database, say "No relevant answers found in either database" and answer from your knowledge
+
+Priority: Conversation History > FAISS_INDEX_IMPROVED > FAISS_INDEX"""
+
+CONTEXT_TEMPLATE = """1. CONVERSATION HISTORY:
+{history_context}
+
+2. FROM FAISS_INDEX_IMPROVED (HUMAN VERIFIED DATABASE):
+{improved_answers}
+
+3. FROM FAISS_INDEX (REGULAR DATABASE):
+{regular_answers}"""
+
+ANSWER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_INSTRUCTIONS),
+    ("system", CONTEXT_TEMPLATE),
+    ("human", "{question}")
+])
+
+
+class PromptAssembler:
+    """Fits conversation history and retrieved documents into a token budget.
+
+    Tokens are counted locally with tiktoken. Each history exchange and
+    document is first capped at its own limit. Parts are then admitted in
+    order of value until the budget runs out:
+
+    1. the latest exchange
+    2. verified answers, best match first
+    3. older exchanges, newest first
+    4. AI-generated answers, best match first
+
+    So AI-generated answers are the first to be cut and the latest
+    exchange the last. The part that crosses the budget is truncated (or
+    dropped if too little room is left), and everything after it is
+    dropped. Admitted parts are rendered in their usual order.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = PROMPT_MAX_TOKENS,
+        doc_max_tokens: int = PROMPT_DOC_MAX_TOKENS,
+        turn_max_tokens: int = PROMPT_TURN_MAX_TOKENS,
+        encoding: str = PROMPT_TOKEN_ENCODING
+    ):
+        self.max_tokens = max_tokens
+        self.doc_max_tokens = doc_max_tokens
+        self.turn_max_tokens = turn_max_tokens
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                logger.warning(f"Could not load tiktoken encoding '{encoding}', estimating tokens from length: {e}")
+        # Instructions, section headers and placeholder texts: everything but the variable parts
+        self.fixed_tokens = self.count(self.render({
+            "history_context": NO_HISTORY,
+            "improved_answers": NO_IMPROVED,
+            "regular_answers": NO_REGULAR,
+            "question": ""
+        }))
+
+    def count(self, text: str) -> int:
+        if self._encoding is None:
+            return len(text) // 4 + 1
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is None:
+            return text[:max_tokens * 4] + TRUNCATION_MARK
+        tokens = self._encoding.encode(text, disallowed_special=())
+        return self._encoding.decode(tokens[:max_tokens]) + TRUNCATION_MARK
+
+    @staticmethod
+    def render(inputs: Dict[str, str]) -> str:
+        return ANSWER_PROMPT.format(**inputs)
+
+    def assemble(
+        self,
+        question: str,
+        history: Sequence[Dict[str, str]],
+        improved_docs: Sequence[Document],
+        regular_docs: Sequence[Document]
+    ) -> Tuple[Dict[str, str], int]:
+        """Return the prompt inputs and the number of tokens in the rendered prompt"""
+        turns = [
+            self.truncate(f"Human: {exchange['Human']}\nAI: {exchange['AI']}", self.turn_max_tokens)
+            for exchange in history
+        ]
+        improved = [self.truncate(doc.page_content, self.doc_max_tokens) for doc in improved_docs]
+        regular = [self.truncate(doc.page_content, self.doc_max_tokens) for doc in regular_docs]
+
+        # (section, position, text) in the order parts are admitted
+        candidates = []
+        if turns:
+            candidates.append(("history", len(turns) - 1, turns[-1]))
+        candidates += [("improved", i, text) for i, text in enumerate(improved)]
+        candidates += [("history", i, turns[i]) for i in range(len(turns) - 2, -1, -1)]
+        candidates += [("regular", i, text) for i, text in enumerate(regular)]
+
+        remaining = self.max_tokens - self.fixed_tokens - self.count(question)
+        admitted = {"history": {}, "improved": {}, "regular": {}}
+        dropped = {"history": 0, "improved": 0, "regular": 0}
+        for n, (section, position, text) in enumerate(candidates):
+            # Part text plus its "Answer N: " label and line break
+            cost = self.count(text) + 6
+            if cost > remaining:
+                if remaining - 6 >= MIN_PART_TOKENS:
+                    admitted[section][position] = self.truncate(text, remaining - 6)
+                else:
+                    dropped[section] += 1
+                # Lower-priority parts never displace a higher-priority one, even if they are shorter
+                for later_section, _, _ in candidates[n + 1:]:
+                    dropped[later_section] += 1
+                break
+            admitted[section][position] = text
+            remaining -= cost
+
+        def ordered(section: str) -> List[str]:
+            return [admitted[section][position] for position in sorted(admitted[section])]
+
+        history_parts, improved_parts, regular_parts = ordered("history"), ordered("improved"), ordered("regular")
+        inputs = {
+            "history_context": "\n".join(history_parts) if history_parts else NO_HISTORY,
+            "improved_answers": "\n".join(f"Answer {i}: {text}" for i, text in enumerate(improved_parts, 1)) or NO_IMPROVED,
+            "regular_answers": "\n".join(f"Answer {i}: {text}" for i, text in enumerate(regular_parts, 1)) or NO_REGULAR,
+            "question": question
+        }
+        for section, count in dropped.items():
+            if count:
+                metrics.record_prompt_part_dropped(section, count)
+        prompt_tokens = self.count(self.render(inputs))
+        metrics.record_prompt_tokens(prompt_tokens)
+        return inputs, prompt_tokens
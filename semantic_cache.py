@@ -0,0 +1,99 @@
+import os
+import threading
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+from cachetools import TTLCache
+import numpy as np
+from cache import normalize_text
+from monitoring import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Semantic cache configuration
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # 1 hour
+
+
+class SemanticAnswerCache:
+    """Reuse answers for questions that are phrased differently but mean the same.
+
+    Answers live in a TTLCache keyed by normalised question, which gives TTL
+    expiry and LRU eviction. The question embeddings are kept alongside and
+    packed into one normalised matrix, rebuilt only after the set of entries
+    changes, so a lookup is a single matrix-vector product.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, maxsize: int = SEMANTIC_CACHE_SIZE, ttl: int = SEMANTIC_CACHE_TTL):
+        self.threshold = threshold
+        self._answers = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._dirty = True
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh(self):
+        # Iterating the TTLCache skips expired entries without touching LRU order
+        keys = list(self._answers)
+        if not self._dirty and len(keys) == len(self._keys):
+            return
+        self._vectors = {key: self._vectors[key] for key in keys}
+        self._keys = keys
+        self._matrix = np.stack([self._vectors[key] for key in keys]) if keys else None
+        self._dirty = False
+
+    def lookup(self, query_embedding: Sequence[float]) -> Optional[Tuple[str, float]]:
+        """Return (answer, similarity) for the closest cached question above the threshold"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        with self._lock:
+            self._refresh()
+            if self._matrix is None or norm == 0:
+                self.misses += 1
+                metrics.record_cache_miss("semantic")
+                return None
+            similarities = self._matrix @ (query / norm)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            answer = self._answers.get(self._keys[best]) if similarity >= self.threshold else None
+            if answer is None:
+                self.misses += 1
+                metrics.record_cache_miss("semantic")
+                return None
+            self.hits += 1
+            metrics.record_cache_hit("semantic")
+            return answer, similarity
+
+    def add(self, question: str, query_embedding: Sequence[float], answer: str):
+        """Remember the final answer to a question"""
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        key = normalize_text(question)
+        with self._lock:
+            self._answers[key] = answer
+            self._vectors[key] = vector / norm
+            self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._answers.clear()
+            self._vectors = {}
+            self._dirty = True
+        logger.info("Semantic answer cache cleared")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._answers),
+            "threshold": self.threshold
+        }
@@ -0,0 +1,74 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from monitoring import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds a request waits on an identical in-flight call before making its own
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "60"))
+
+T = TypeVar("T")
+
+
+class SingleFlightTimeout(Exception):
+    """Raised to a request that waited too long on a call started by another request"""
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome.
+
+    The first request for a key starts the call as a task; requests for the
+    same key that arrive while it is running wait on that task instead of
+    starting their own, and get its result or its exception. The task is
+    shielded, so a waiter that is cancelled (or the request that started
+    it) does not cancel it for the others. A request that joined an
+    in-flight call and waits longer than `timeout` seconds is detached with
+    SingleFlightTimeout, so the caller can make its own call; the shared
+    call itself keeps running for the rest.
+    """
+
+    def __init__(self, name: str, timeout: float = SINGLE_FLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.shared = 0
+        self.detached = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Outcome of `call()`, or of the identical call already in flight for `key`"""
+        task = self._calls.get(key)
+        if task is None:
+            self.started += 1
+            task = self._calls[key] = asyncio.create_task(call(), name=f"single-flight-{self.name}")
+            task.add_done_callback(lambda done: self._finished(key, done))
+            return await asyncio.shield(task)
+
+        self.shared += 1
+        metrics.record_single_flight_shared(self.name)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            self.detached += 1
+            metrics.record_single_flight_detached(self.name)
+            logger.warning(f"Stopped waiting on in-flight {self.name} call after {self.timeout:g}s")
+            raise SingleFlightTimeout(f"timed out waiting for an identical {self.name} request") from None
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved in case every waiter was detached or cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "started": self.started,
+            "shared": self.shared,
+            "detached": self.detached
+        }
@@ -0,0 +1,292 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+import aiohttp
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_sdk.web.async_slack_response import AsyncSlackResponse
+from monitoring import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Slack gateway configuration
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")  # point at a local fake Slack server for testing
+SLACK_HTTP_POOL_SIZE = int(os.getenv("SLACK_HTTP_POOL_SIZE", "50"))  # shared HTTP connections to Slack
+SLACK_CHANNEL_QUEUE_SIZE = int(os.getenv("SLACK_CHANNEL_QUEUE_SIZE", "100"))  # pending sends per channel
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", "3"))  # retries of a rate limited call
+SLACK_SHUTDOWN_TIMEOUT = float(os.getenv("SLACK_SHUTDOWN_TIMEOUT", "10"))
+CHANNEL_IDLE_SECONDS = 60  # a channel's queue worker exits after this long without messages
+BURST_SECONDS = 10  # calls a rate limit allows in a burst, in seconds' worth of its rate
+DEFAULT_RETRY_AFTER = 1.0  # seconds to back off when a 429 has no Retry-After header
+DROPPABLE_RESERVE = 0.5  # share of a rate limit's burst that droppable calls (streaming edits) leave for the rest
+
+# Calls per minute of Slack's Web API rate limit tiers
+RATE_TIERS = {1: 1, 2: 20, 3: 50, 4: 100}
+METHOD_TIERS = {
+    "auth.test": 4,
+    "chat.update": 3,
+    "conversations.history": 3,
+    "conversations.replies": 3
+}
+DEFAULT_TIER = 3
+# chat.postMessage is limited per channel rather than per workspace
+CHANNEL_RATES = {"chat.postMessage": 60}
+
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` calls a minute with bursts of BURST_SECONDS' worth.
+
+    A 429 pauses the bucket until Slack's Retry-After has passed.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def try_acquire(self, reserve: float = 0.0) -> bool:
+        """Take a token only if one is free right now beyond `reserve` and no call is waiting"""
+        now = time.monotonic()
+        if self._lock.locked() or now < self._paused_until:
+            return False
+        self._refill(now)
+        if self._tokens < 1 + reserve:
+            return False
+        self._tokens -= 1
+        return True
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+@dataclass
+class _ChannelQueue:
+    queue: asyncio.Queue
+    worker: Optional[asyncio.Task] = None
+    sent: int = 0
+
+
+def _retry_after(error: SlackApiError) -> float:
+    headers = getattr(error.response, "headers", None) or {}
+    for name, value in headers.items():
+        if name.lower() == "retry-after":
+            try:
+                return float(value[0] if isinstance(value, list) else value)
+            except (TypeError, ValueError):
+                break
+    return DEFAULT_RETRY_AFTER
+
+
+class SlackGateway:
+    """Async Slack Web API client shared by the whole process.
+
+    All calls go through one AsyncWebClient on a pooled aiohttp session and
+    wait for the rate limit of their method: workspace-wide per tier, or
+    per channel for chat.postMessage. A 429 pauses that limit for the
+    Retry-After interval and the call is retried. Sends (posts and edits)
+    are queued per channel and delivered one at a time by a worker per
+    channel, so messages to a channel arrive in the order they were sent
+    even when some are retried. Reads are not queued. Droppable calls
+    (progress edits of a streamed reply) are only made when their rate limit
+    has tokens to spare and nothing else is waiting on it; otherwise they
+    are skipped at once, so they never delay the calls that matter.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str],
+        base_url: str = SLACK_API_URL,
+        pool_size: int = SLACK_HTTP_POOL_SIZE,
+        queue_size: int = SLACK_CHANNEL_QUEUE_SIZE,
+        max_retries: int = SLACK_MAX_RETRIES
+    ):
+        self.token = token
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.client: Optional[AsyncWebClient] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._channels: Dict[str, _ChannelQueue] = {}
+        self._accepting = False
+        self.calls = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.dropped = 0
+
+    async def start(self):
+        """Open the shared HTTP session. Must be called from a running event loop."""
+        if self._session is not None:
+            return
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+        self.client = AsyncWebClient(token=self.token, base_url=self.base_url, session=self._session)
+        self._accepting = True
+        logger.info(f"Slack gateway started ({self.base_url}, {self.pool_size} connections)")
+
+    async def shutdown(self, timeout: float = SLACK_SHUTDOWN_TIMEOUT):
+        """Deliver queued sends (up to `timeout` seconds), then close the HTTP session"""
+        self._accepting = False
+        queues = [channel.queue.join() for channel in self._channels.values()]
+        if queues:
+            try:
+                await asyncio.wait_for(asyncio.gather(*queues), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Slack gateway stopped with {self.pending()} messages still queued")
+        for channel in list(self._channels.values()):
+            if channel.worker is not None:
+                channel.worker.cancel()
+        self._channels.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # ---- Calls -------------------------------------------------------------
+
+    def _limiter(self, method: str, channel: Optional[str]) -> RateLimiter:
+        if method in CHANNEL_RATES and channel is not None:
+            key, per_minute = f"{method}:{channel}", CHANNEL_RATES[method]
+        else:
+            key, per_minute = method, RATE_TIERS[METHOD_TIERS.get(method, DEFAULT_TIER)]
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = RateLimiter(per_minute)
+        return limiter
+
+    async def call(self, method: str, droppable: bool = False, **kwargs) -> Optional[AsyncSlackResponse]:
+        """Call a Web API method (e.g. "conversations.replies") within its rate limit, retrying on 429
+
+        A droppable call returns None instead of waiting for the rate limit or retrying.
+        """
+        if self.client is None:
+            raise RuntimeError("Slack gateway is not started")
+        limiter = self._limiter(method, kwargs.get("channel"))
+        api = getattr(self.client, method.replace(".", "_"))
+        for attempt in range(self.max_retries + 1):
+            if not droppable:
+                await limiter.acquire()
+            elif not limiter.try_acquire(limiter.capacity * DROPPABLE_RESERVE):
+                self.dropped += 1
+                metrics.record_slack_call(method, "dropped")
+                return None
+            self.calls += 1
+            try:
+                response = await api(**kwargs)
+                metrics.record_slack_call(method, "ok")
+                return response
+            except SlackApiError as e:
+                if e.response.status_code == 429 and droppable:
+                    limiter.pause(_retry_after(e))
+                    self.rate_limited += 1
+                    self.dropped += 1
+                    metrics.record_slack_call(method, "dropped")
+                    return None
+                if e.response.status_code != 429 or attempt == self.max_retries:
+                    self.failed += 1
+                    metrics.record_slack_call(method, "error")
+                    raise
+                retry_after = _retry_after(e)
+                self.rate_limited += 1
+                metrics.record_slack_call(method, "rate_limited")
+                logger.warning(f"Slack rate limited {method}, retrying in {retry_after:.1f}s")
+                limiter.pause(retry_after)
+
+    async def send(self, method: str, channel: str, **kwargs) -> AsyncSlackResponse:
+        """Queue a call that changes a channel's messages behind earlier ones and wait for its response"""
+        if not self._accepting:
+            raise RuntimeError("Slack gateway is not accepting messages")
+        entry = self._channels.get(channel)
+        if entry is None:
+            entry = self._channels[channel] = _ChannelQueue(asyncio.Queue(maxsize=self.queue_size))
+            entry.worker = asyncio.create_task(self._channel_worker(channel, entry), name=f"slack-channel-{channel}")
+        future = asyncio.get_running_loop().create_future()
+        # Waits for room when the channel is backed up
+        await entry.queue.put((method, kwargs, future, time.monotonic()))
+        metrics.record_slack_queue_depth(self.pending())
+        return await future
+
+    async def _channel_worker(self, channel: str, entry: _ChannelQueue):
+        while True:
+            try:
+                method, kwargs, future, queued_at = await asyncio.wait_for(entry.queue.get(), CHANNEL_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                if entry.queue.empty():
+                    # Nothing awaits between the check and the removal, so no send can slip in
+                    del self._channels[channel]
+                    return
+                continue
+            metrics.record_slack_queue_wait(time.monotonic() - queued_at)
+            try:
+                if not future.cancelled():
+                    response = await self.call(method, channel=channel, **kwargs)
+                    entry.sent += 1
+                    if not future.cancelled():
+                        future.set_result(response)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                entry.queue.task_done()
+                metrics.record_slack_queue_depth(self.pending())
+
+    # ---- Web API methods used by the bot -----------------------------------
+
+    async def post_message(self, channel: str, text: str, thread_ts: Optional[str] = None, **kwargs) -> AsyncSlackResponse:
+        return await self.send("chat.postMessage", channel, text=text, thread_ts=thread_ts, **kwargs)
+
+    async def update_message(self, channel: str, ts: str, text: str, droppable: bool = False, **kwargs) -> Optional[AsyncSlackResponse]:
+        return await self.send("chat.update", channel, ts=ts, text=text, droppable=droppable, **kwargs)
+
+    async def conversations_history(self, **kwargs) -> AsyncSlackResponse:
+        return await self.call("conversations.history", **kwargs)
+
+    async def conversations_replies(self, **kwargs) -> AsyncSlackResponse:
+        return await self.call("conversations.replies", **kwargs)
+
+    async def auth_test(self) -> AsyncSlackResponse:
+        return await self.call("auth.test")
+
+    # ---- Stats -------------------------------------------------------------
+
+    def pending(self) -> int:
+        return sum(entry.queue.qsize() for entry in self._channels.values())
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+            "queued": self.pending(),
+            "active_channels": len(self._channels)
+        }
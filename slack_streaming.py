@@ -0,0 +1,163 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Streaming configuration
+SLACK_STREAMING = os.getenv("SLACK_STREAMING", "true").lower() == "true"
+STREAM_UPDATE_TOKENS = int(os.getenv("STREAM_UPDATE_TOKENS", "10"))  # new chunks needed for an update...
+# ...at most this often; chat.update is Tier 3 (50 a minute for the whole workspace)
+STREAM_UPDATE_INTERVAL = float(os.getenv("STREAM_UPDATE_INTERVAL", "3.0"))
+STREAM_PLACEHOLDER = os.getenv("STREAM_PLACEHOLDER", "_Thinking..._")
+STREAM_CURSOR = " ▌"
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a prefix of tag"""
+    for length in range(min(len(text), len(tag) - 1), 0, -1):
+        if tag.startswith(text[-length:]):
+            return length
+    return 0
+
+
+class ThinkTagFilter:
+    """Strips <think>...</think> spans from a stream of text chunks.
+
+    Tags may be split across chunks, so a possible partial tag at the end of
+    the buffer is held back until the next chunk shows what it is.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_think = False
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk and return the newly visible text"""
+        self._buffer += chunk
+        visible = []
+        while self._buffer:
+            if self._in_think:
+                end = self._buffer.find(THINK_CLOSE)
+                if end == -1:
+                    # Only keep what could be the start of the closing tag
+                    keep = _partial_tag_length(self._buffer, THINK_CLOSE)
+                    self._buffer = self._buffer[len(self._buffer) - keep:] if keep else ""
+                    break
+                self._buffer = self._buffer[end + len(THINK_CLOSE):]
+                self._in_think = False
+            else:
+                start = self._buffer.find(THINK_OPEN)
+                if start == -1:
+                    keep = _partial_tag_length(self._buffer, THINK_OPEN)
+                    visible.append(self._buffer[:len(self._buffer) - keep])
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                visible.append(self._buffer[:start])
+                self._buffer = self._buffer[start + len(THINK_OPEN):]
+                self._in_think = True
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """Return any held-back text once the stream has ended"""
+        remaining = "" if self._in_think else self._buffer
+        self._buffer = ""
+        return remaining
+
+
+class SlackStreamWriter:
+    """Progressively renders a streamed LLM reply into a single Slack message.
+
+    A placeholder is posted in the thread first, then edited with
+    chat_update once STREAM_UPDATE_TOKENS new chunks have arrived, but no
+    more than once every STREAM_UPDATE_INTERVAL seconds and with never more
+    than one update in flight. Progress edits are droppable: the gateway
+    skips them when chat.update's workspace rate limit has nothing to spare,
+    so they never hold up the final edit of this or any other reply.
+    Messages go out through the SlackGateway's channel queue, so the final
+    edit lands after the partial ones.
+    """
+
+    def __init__(
+        self,
+        gateway,
+        channel: str,
+        thread_ts: str,
+        update_tokens: int = STREAM_UPDATE_TOKENS,
+        update_interval: float = STREAM_UPDATE_INTERVAL
+    ):
+        self.gateway = gateway
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.update_tokens = update_tokens
+        self.update_interval = update_interval
+        self.ts: Optional[str] = None
+        self.text = ""
+        self.updates = 0
+        self._filter = ThinkTagFilter()
+        self._pending_chunks = 0
+        self._last_update = 0.0
+        self._rendered = ""
+        self._update_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Post the placeholder reply in the thread"""
+        try:
+            response = await self.gateway.post_message(
+                channel=self.channel,
+                thread_ts=self.thread_ts,
+                text=STREAM_PLACEHOLDER
+            )
+            self.ts = response["ts"]
+            self._last_update = time.monotonic()
+        except Exception as e:
+            # Without a placeholder we simply post the full answer at the end
+            logger.error(f"Error posting streaming placeholder: {e}")
+
+    async def push(self, chunk: str):
+        """Add a chunk of LLM output, updating the Slack message when due"""
+        self.text += self._filter.feed(chunk)
+        self._pending_chunks += 1
+        if self.ts is None or not self.text.strip():
+            return
+        if self._update_task is not None and not self._update_task.done():
+            return
+        elapsed = time.monotonic() - self._last_update
+        if self._pending_chunks >= self.update_tokens and elapsed >= self.update_interval:
+            self._pending_chunks = 0
+            self._last_update = time.monotonic()
+            self._update_task = asyncio.create_task(self._update(self.text.strip() + STREAM_CURSOR))
+
+    async def _update(self, text: str):
+        if text == self._rendered:
+            return
+        try:
+            response = await self.gateway.update_message(channel=self.channel, ts=self.ts, text=text, droppable=True)
+            if response is not None:
+                self._rendered = text
+                self.updates += 1
+        except Exception as e:
+            logger.warning(f"Error updating streamed message: {e}")
+
+    async def finish(self, final_text: str):
+        """Replace the streamed text with the final answer (or post it if there is no placeholder)"""
+        self.text += self._filter.flush()
+        if self._update_task is not None:
+            # Let the last partial update land first so it can't overwrite the final text
+            await self._update_task
+        if self.ts is None:
+            return await self.gateway.post_message(
+                channel=self.channel,
+                thread_ts=self.thread_ts,
+                text=final_text
+            )
+        response = await self.gateway.update_message(channel=self.channel, ts=self.ts, text=final_text)
+        self.updates += 1
+        return response
@@ -0,0 +1,36 @@
+from cache import flag_verdict_cache
+from flag_classifier import FlagClassifier
+from flagged_index import FlaggedQuestionIndex
+
+QUESTION = "How do I reset my VPN token?"
+EMBEDDING = [1.0, 0.0, 0.0]
+
+
+def never_uncertain(text: str) -> bool:
+    raise AssertionError("the LLM should not be consulted")
+
+
+def test_answered_question_is_no_longer_refused():
+    flag_verdict_cache.clear()
+    index = FlaggedQuestionIndex()
+    classifier = FlagClassifier(index, never_uncertain)
+
+    index.add(1, EMBEDDING)
+    assert classifier.classify(QUESTION, EMBEDDING) is True
+
+    # Answering the question (/submit_answer) removes it from the flagged index
+    index.remove(1)
+    assert classifier.classify(QUESTION, EMBEDDING) is False
+
+
+def test_newly_flagged_question_is_refused():
+    flag_verdict_cache.clear()
+    index = FlaggedQuestionIndex()
+    index.add(1, [0.0, 1.0, 0.0])
+    classifier = FlagClassifier(index, never_uncertain)
+
+    assert classifier.classify(QUESTION, EMBEDDING) is False
+
+    # A dislike flags the question
+    index.add(2, EMBEDDING)
+    assert classifier.classify(QUESTION, EMBEDDING) is True
@@ -0,0 +1,227 @@
+import os
+import math
+import threading
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from ann_index import empty_like, search_params
+from index_store import DurableFaissIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Unified retrieval configuration
+UNIFIED_RETRIEVAL = os.getenv("UNIFIED_RETRIEVAL", "false").lower() == "true"
+MIN_RELEVANCE = float(os.getenv("UNIFIED_MIN_RELEVANCE", "-inf"))  # relevance a doc needs to be returned
+OVERSAMPLE = 4  # initial candidates fetched per requested result
+MAX_FETCH = 4096  # beyond this a tier that is still short is searched on its own
+
+TIER_GENERATED = 0
+TIER_VERIFIED = 1
+TIER_DELETED = 255
+
+
+def relevance_score(score: float, metric_type: int) -> float:
+    """Raw FAISS score as a relevance where higher is better"""
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        return score
+    # Same scale as langchain's euclidean relevance score
+    return 1.0 - score / math.sqrt(2)
+
+
+class UnifiedRetriever:
+    """Single-pass retrieval over the AI-generated and verified knowledge bases.
+
+    Both tiers' vectors live in one FAISS index, each tagged with its tier in
+    a compact uint8 array indexed by row, so one ANN query serves both
+    knowledge bases. The combined index has the same type and training as the
+    AI-generated index (see ann_index). ANN indexes can't remove vectors, so a
+    deleted verified answer is only re-tagged as deleted and skipped.
+    Documents themselves stay in the original docstores and are looked up
+    only for the results returned.
+
+    Only the AI-generated docstore is kept, not its index: every search for
+    that tier is served from the combined index, so the caller can drop the
+    original vector store. The verified vectors are held twice, since the
+    DurableFaissIndex remains the store that is written and snapshotted.
+
+    The verified tier follows the DurableFaissIndex through its change
+    listener, so additions, deletions and hot reloads show up here too.
+    """
+
+    def __init__(
+        self,
+        generated: FAISS,
+        verified: DurableFaissIndex,
+        min_relevance: float = MIN_RELEVANCE
+    ):
+        self.generated_docstore = generated.docstore
+        self.verified = verified
+        self.min_relevance = min_relevance
+        self.metric = generated.index.metric_type
+        self.normalize = generated._normalize_L2
+        self._index = empty_like(generated.index)
+        self._tiers = np.zeros(1024, dtype=np.uint8)
+        self._doc_ids: List[Optional[str]] = []
+        self._rows: Dict[Tuple[int, str], int] = {}
+        self._counts = {TIER_GENERATED: 0, TIER_VERIFIED: 0}
+        self._lock = threading.RLock()
+        self.queries = 0
+        self.requeries = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def build(cls, generated: FAISS, verified: DurableFaissIndex, **kwargs) -> "UnifiedRetriever":
+        retriever = cls(generated, verified, **kwargs)
+        with retriever._lock:
+            total = generated.index.ntotal
+            for start in range(0, total, 10000):
+                count = min(10000, total - start)
+                ids = [generated.index_to_docstore_id[i] for i in range(start, start + count)]
+                retriever._add(TIER_GENERATED, ids, generated.index.reconstruct_n(start, count))
+            retriever._load_verified()
+        verified.add_listener(retriever._on_verified_change)
+        logger.info(f"Unified retrieval index built with {retriever._index.ntotal} vectors")
+        return retriever
+
+    # ---- Maintenance -------------------------------------------------------
+
+    def _add(self, tier: int, doc_ids: List[str], vectors: np.ndarray):
+        rows = [(doc_id, vector) for doc_id, vector in zip(doc_ids, vectors) if (tier, doc_id) not in self._rows]
+        if not rows:
+            return
+        start = len(self._doc_ids)
+        matrix = np.array([vector for _, vector in rows], dtype=np.float32)
+        if self.normalize:
+            faiss.normalize_L2(matrix)
+        if start + len(rows) > len(self._tiers):
+            grown = np.zeros(max(2 * len(self._tiers), start + len(rows)), dtype=np.uint8)
+            grown[:start] = self._tiers[:start]
+            self._tiers = grown
+        self._tiers[start:start + len(rows)] = tier
+        for row_id, (doc_id, _) in enumerate(rows, start):
+            self._doc_ids.append(doc_id)
+            self._rows[(tier, doc_id)] = row_id
+        self._counts[tier] += len(rows)
+        self._index.add(matrix)
+
+    def _remove(self, tier: int, doc_ids: List[str]):
+        row_ids = [self._rows.pop((tier, doc_id)) for doc_id in doc_ids if (tier, doc_id) in self._rows]
+        if not row_ids:
+            return
+        for row_id in row_ids:
+            self._doc_ids[row_id] = None
+            self._tiers[row_id] = TIER_DELETED
+        self._counts[tier] -= len(row_ids)
+
+    def _load_verified(self):
+        for doc_ids, vectors in self.verified.iter_vectors():
+            self._add(TIER_VERIFIED, doc_ids, vectors)
+
+    def _on_verified_change(self, op: str, doc_ids: List[str], vectors: Optional[np.ndarray]):
+        with self._lock:
+            if op == "add":
+                self._add(TIER_VERIFIED, doc_ids, vectors)
+            elif op == "delete":
+                self._remove(TIER_VERIFIED, doc_ids)
+            elif op == "reload":
+                # Documents never change under the same id, so only the difference needs applying
+                current = set()
+                for doc_ids, vectors in self.verified.iter_vectors():
+                    current.update(doc_ids)
+                    self._add(TIER_VERIFIED, doc_ids, vectors)
+                self._remove(TIER_VERIFIED, [doc_id for tier, doc_id in list(self._rows) if tier == TIER_VERIFIED and doc_id not in current])
+
+    # ---- Search ------------------------------------------------------------
+
+    def _relevance(self, score: float) -> float:
+        return relevance_score(score, self.metric)
+
+    def _document(self, tier: int, doc_id: str) -> Optional[Document]:
+        if tier == TIER_VERIFIED:
+            return self.verified.get_document(doc_id)
+        doc = self.generated_docstore.search(doc_id)
+        return doc if isinstance(doc, Document) else None
+
+    def _search_tier(self, query: np.ndarray, tier: int, k: int) -> List[Tuple[str, float]]:
+        # Only this tier's rows are visited, through a bitmap over row ids
+        rows = self._tiers[:self._index.ntotal] == tier
+        bitmap = np.packbits(rows, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(rows), faiss.swig_ptr(bitmap))
+        scores, row_ids = self._index.search(query, k, params=search_params(self._index, selector))
+        return [(self._doc_ids[row_id], float(score)) for score, row_id in zip(scores[0], row_ids[0]) if row_id != -1]
+
+    def search_with_score(self, embedding: Sequence[float], k: int = 2) -> Dict[int, List[Tuple[Document, float]]]:
+        """Return the top k (document, raw score) pairs from each tier with one index query.
+
+        The candidate pool starts at OVERSAMPLE * k per tier and is widened
+        only when one tier is under-represented in it. If a tier is still
+        short after MAX_FETCH candidates, the AI-generated tier is searched
+        again restricted to its own rows and the verified tier in its own index.
+        """
+        query = np.array([embedding], dtype=np.float32)
+        if self.normalize:
+            faiss.normalize_L2(query)
+        with self._lock:
+            self.queries += 1
+            total = self._index.ntotal
+            fetch = min(total, 2 * OVERSAMPLE * k)
+            while True:
+                scores, row_ids = self._index.search(query, fetch) if fetch else (np.empty((1, 0)), np.empty((1, 0)))
+                results = {TIER_GENERATED: [], TIER_VERIFIED: []}
+                for score, row_id in zip(scores[0], row_ids[0]):
+                    if row_id == -1:
+                        continue
+                    tier = int(self._tiers[row_id])
+                    if tier != TIER_DELETED and len(results[tier]) < k:
+                        results[tier].append((self._doc_ids[row_id], float(score)))
+                short = [tier for tier, count in self._counts.items() if len(results[tier]) < min(k, count)]
+                if not short or fetch >= min(total, MAX_FETCH):
+                    break
+                self.requeries += 1
+                fetch = min(total, MAX_FETCH, fetch * 4)
+            if TIER_GENERATED in short:
+                self.fallbacks += 1
+                results[TIER_GENERATED] = self._search_tier(query, TIER_GENERATED, k)
+
+        if TIER_VERIFIED in short:
+            # The verified index is still held on its own, and a few rows buried in
+            # a large ANN index can be out of reach of a restricted search
+            self.fallbacks += 1
+            hits = self.verified.similarity_search_with_score_by_vector(list(embedding), k=k)
+            results[TIER_VERIFIED] = [(doc.id, score) for doc, score in hits if doc.id is not None]
+
+        documents = {}
+        for tier, hits in results.items():
+            documents[tier] = []
+            for doc_id, score in hits:
+                if self._relevance(score) < self.min_relevance:
+                    continue
+                doc = self._document(tier, doc_id)
+                if doc is not None:
+                    documents[tier].append((doc, score))
+        return documents
+
+    def search(self, embedding: Sequence[float], k: int = 2) -> Tuple[List[Document], List[Document]]:
+        """Return (verified_docs, generated_docs), the top k of each tier"""
+        results = self.search_with_score(embedding, k)
+        return (
+            [doc for doc, _ in results[TIER_VERIFIED]],
+            [doc for doc, _ in results[TIER_GENERATED]]
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "vectors": self._index.ntotal,
+                "deleted_vectors": self._index.ntotal - self._counts[TIER_VERIFIED] - self._counts[TIER_GENERATED],
+                "verified_vectors": self._counts[TIER_VERIFIED],
+                "generated_vectors": self._counts[TIER_GENERATED],
+                "queries": self.queries,
+                "requeries": self.requeries,
+                "fallbacks": self.fallbacks
+            }
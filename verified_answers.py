@@ -0,0 +1,72 @@
+import os
+import logging
+from typing import Optional, Sequence, Tuple
+from langchain_core.documents import Document
+from knowledge_dedup import split_document
+from monitoring import metrics
+from unified_retrieval import relevance_score
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Verified answer fast path configuration
+VERIFIED_FAST_PATH = os.getenv("VERIFIED_FAST_PATH", "true").lower() == "true"
+# Relevance (langchain's scale, 1.0 = identical) the top verified answer needs to be sent without the LLM
+VERIFIED_FAST_PATH_THRESHOLD = float(os.getenv("VERIFIED_FAST_PATH_THRESHOLD", "0.9"))
+VERIFIED_ANSWER_TEMPLATE = "{answer}\n\n_Verified answer to: {question}_"
+
+
+def format_verified_answer(doc: Document) -> Optional[str]:
+    """Reply text for a verified knowledge base document, or None if it has no answer"""
+    parsed = split_document(doc.page_content)
+    if parsed is None:
+        return None
+    question, answer = parsed
+    question = doc.metadata.get("original_question") or question
+    return VERIFIED_ANSWER_TEMPLATE.format(question=question.strip(), answer=answer.strip())
+
+
+class VerifiedAnswerFastPath:
+    """Answers a question straight from the verified knowledge base.
+
+    When the top scored hit from the verified index is at least `threshold`
+    relevant, its stored answer is the reply and no LLM call is made. The
+    scores are the raw FAISS scores of the index searched, converted with
+    its metric, so they work for both L2 and inner product indexes.
+    """
+
+    def __init__(self, metric_type: int, threshold: float = VERIFIED_FAST_PATH_THRESHOLD, enabled: bool = VERIFIED_FAST_PATH):
+        self.metric_type = metric_type
+        self.threshold = threshold
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, verified_hits: Sequence[Tuple[Document, float]]) -> Optional[Tuple[str, float]]:
+        """Return (reply, relevance) if the best verified hit clears the threshold"""
+        if not self.enabled:
+            return None
+        reply, relevance = None, None
+        if verified_hits:
+            doc, score = verified_hits[0]
+            relevance = relevance_score(score, self.metric_type)
+            if relevance >= self.threshold:
+                reply = format_verified_answer(doc)
+        if reply is None:
+            self.misses += 1
+            metrics.record_verified_fast_path(False)
+            return None
+        self.hits += 1
+        metrics.record_verified_fast_path(True)
+        return reply, relevance
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "threshold": self.threshold
+        }